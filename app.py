@@ -1,10 +1,23 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 from styles import get_dashboard_styles, get_table_styles, apply_default_styles
 from utils import (create_metric_box, create_metric_box_0, create_comparison_metric, 
-                  calculate_comparison, style_dataframe)
-from config import METRICS_CONFIG, TABLE_CONFIGS
+                  format_comparison, format_spread, style_dataframe)
+from config import METRICS_CONFIG, TABLE_CONFIGS, DATA_BACKEND, HIERARCHY_COLUMNS
+from schema import projected_columns
+from snapshot_store import FRAME_HASH_FUNCS, frame_fingerprint, ingest_csv, open_shared_snapshot
+from snapshot_history import list_periods, load_index, load_period
+from hierarchy import build_hierarchy_index, child_options
+from filter_engine import build_filter_index, branch_paths, filter_snapshots, select_rows
+from ranking import scope_ranks, row_rank, format_rank
+from scorecard_metrics import (OVERALL_SCORE_COLUMN, summarize_frame, column_means, format_pl_distribution,
+                               pl_histogram, pl_bucket_shares, pl_bucket_title,
+                               build_metric_cube, cube_summary)
+import sql_backend
+from result_cache import cached_result, result_cache_stats
+from single_flight import load_current, reload_stats
 from comparison_utils import (load_data_versions, create_comparison_indicator, format_with_delta,
                             calculate_impact, create_impact_table, style_impact_table)
 from data_comparison import (load_comparison_data, filter_comparison_data, calculate_change,
@@ -14,11 +27,8 @@ from data_comparison import (load_comparison_data, filter_comparison_data, calcu
 # Set page configuration
 st.set_page_config(layout="wide", page_title="Branch Manager Scorecard", page_icon="📊")
 
-# Apply styles
-st.markdown(apply_default_styles(), unsafe_allow_html=True)
-
-# Add custom CSS for delta indicators
-st.markdown("""
+# Custom CSS for delta indicators
+DELTA_STYLES = """
 <style>
     .delta-indicator {
         display: inline-block;
@@ -59,41 +69,147 @@ st.markdown("""
         border-left: 3px solid #0052CC;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_resource
+def page_styles():
+    """Page CSS, built once per server process and re-emitted on each full rerun"""
+    return apply_default_styles() + DELTA_STYLES
+
+# Apply styles
+st.markdown(page_styles(), unsafe_allow_html=True)
 
 # Header
 st.markdown('<div class="blue-header"><h3>Consumer Banking Branch Manager Scorecard</h3></div>', unsafe_allow_html=True)
 
 # Region selector with spacing
-col1, col2, col3, col4, spacing, col5, spacing, col6 = st.columns([1, 1, 1, 1, 0.3, 1, 2.5, 1])
+col1, col2, col3, col4, spacing, col6 = st.columns([1, 1, 1, 1, 3.8, 1])
 
 # Debug comparison checkbox
 with col6:
     debug_compare = st.checkbox("Debug: Compare with Previous", key="debug_compare")
 
-# Checkbox for actual data
-with col5:
-    show_actual = st.checkbox("Show Actual", key="show_actual")
-
 # Load data
-@st.cache_data
-def load_data(is_actual=False):
+@st.cache_resource(max_entries=8)
+def load_shared_data(path, digest):
+    """
+    Memory-map the snapshot of a scorecard CSV once per server process.
+    The frame is shared by every session, so it must be treated as read-only.
+    `digest` keys the cache on file contents so a replaced file is picked up.
+    Only the columns referenced by the config are loaded.
+    """
+    return open_shared_snapshot(path, columns=projected_columns())
+
+def load_sql_table(path, digest):
+    """
+    Copy the snapshot of a scorecard CSV into the embedded database once per file version.
+    Not cached here: load_current holds the table name per version, and ingest_snapshot
+    drops superseded tables, so a name cached by digest could point at a dropped table.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return sql_backend.ingest_snapshot(name, digest, ingest_csv(path))
+
+def current_version(is_actual=False):
+    """
+    (digest, data) of the dataset version this run uses: the shared frame, or the table
+    name under the SQL backend. Resolved with one load_current call and passed to every
+    derived loader, so nothing pairs rows of one version with the digest of another.
+    A replaced file is reloaded by the first session that sees it; sessions arriving
+    meanwhile keep the previous version. (None, None) when the file can't be loaded.
+    """
+    path = 'branch_data_actual.csv' if is_actual else 'branch_data.csv'
     try:
-        if is_actual:
-            return pd.read_csv('branch_data_actual.csv')
-        return pd.read_csv('branch_data.csv')
+        if DATA_BACKEND == 'sql':
+            return load_current(f"sql:{path}", path, load_sql_table)
+        return load_current(f"frame:{path}", path, load_shared_data)
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
-        return pd.DataFrame()
+        return None, None
+
+@st.cache_resource(max_entries=8, hash_funcs=FRAME_HASH_FUNCS)
+def load_hierarchy(data):
+    """
+    Selector options for one dataset version (frame or SQL table), built once and shared by every session
+    """
+    if DATA_BACKEND == 'sql':
+        return build_hierarchy_index(sql_backend.distinct_rows(data, HIERARCHY_COLUMNS))
+    return build_hierarchy_index(data)
+
+# Selector options come from the scorecard data; the actual data covers the same branches,
+# so toggling "Show Actual" doesn't touch the filter bar
+_, hierarchy_data = current_version()
+hierarchy = (build_hierarchy_index(pd.DataFrame(columns=HIERARCHY_COLUMNS)) if hierarchy_data is None
+             else load_hierarchy(hierarchy_data))
+
+def selector_options(column, parent_column=None, parent_value=None):
+    """Options of a hierarchy selector, optionally within one parent selection"""
+    return child_options(hierarchy, column, parent_column, parent_value)
+
+@st.cache_resource(max_entries=16)
+def load_history_period(period, digest):
+    """
+    Load one recorded period once per server process; shared and read-only like load_shared_data.
+    `digest` identifies the immutable version so lookups never touch the index twice.
+    """
+    return load_period(period, columns=projected_columns())
+
+def load_version(version):
+    """Frame of a ('period' | 'csv', name, digest) version"""
+    kind, name, digest = version
+    if kind == 'period':
+        return load_history_period(name, digest)
+    return load_shared_data(name, digest)
 
-# Load appropriate dataset
-df = load_data(show_actual)
+@st.cache_resource(max_entries=16)
+def load_branch_index(version):
+    """
+    Branch -> row positions for one snapshot version
+    """
+    return build_filter_index(load_version(version), ['Branch'])['Branch']
+
+@st.cache_resource(max_entries=8)
+def load_branch_paths(versions):
+    """
+    Hierarchy path of every branch across the compared versions
+    """
+    return branch_paths([load_version(version) for version in versions])
+
+def comparison_fingerprint(versions):
+    """Fingerprints of the compared snapshots, for cache keys"""
+    return tuple(frame_fingerprint(load_version(version)) for version in versions)
+
+def load_comparison_rows(versions, division, region, market, branch):
+    """
+    Rows of each compared version matching the selectors. The filter plan is evaluated
+    once on the branch paths, then applied to every version through its branch index.
+    """
+    return cached_result(
+        ('comparison_rows', comparison_fingerprint(versions), division, region, market, branch, False, True),
+        lambda: tuple(filter_snapshots(
+            [load_version(version) for version in versions],
+            {'Division': division, 'Region': region, 'Market': market, 'Branch': branch},
+            branch_indexes=[load_branch_index(version) for version in versions],
+            paths=load_branch_paths(versions)
+        ))
+    )
 
 # Load comparison data if debug mode is enabled
 if debug_compare:
     try:
-        current_df = pd.read_csv('branch_data.csv')
-        previous_df = pd.read_csv('branch_data_previous.csv')
+        history_periods = list_periods()
+        if len(history_periods) >= 2:
+            # Compare a recorded period with any earlier one, newest first
+            with col6:
+                current_period = st.selectbox("Current period", history_periods[:0:-1], index=0)
+                earlier_periods = history_periods[:history_periods.index(current_period)]
+                previous_period = st.selectbox("Compare with", earlier_periods[::-1], index=0)
+            history_index = load_index()
+            comparison_versions = (('period', current_period, history_index[current_period]['digest']),
+                                   ('period', previous_period, history_index[previous_period]['digest']))
+        else:
+            comparison_versions = tuple(('csv', path, load_current(f"frame:{path}", path, load_shared_data)[0])
+                                        for path in ('branch_data.csv', 'branch_data_previous.csv'))
+        current_df, previous_df = (load_version(version) for version in comparison_versions)
     except Exception as e:
         st.error(f"Error loading comparison data: {str(e)}")
         st.warning("Make sure you have both branch_data.csv and branch_data_previous.csv files.")
@@ -102,96 +218,146 @@ if debug_compare:
 else:
     current_df, previous_df = None, None
 
+# Selectors are multi-selects: an empty selection means "All", several values are combined.
+# Values are kept as tuples so they can key the cached lookups below.
+
 # Division selector
-division_options = ['All Divisions'] + list(df['Division'].unique()) if not df.empty else ['All Divisions']
 with col1:
-    division = st.selectbox("Division", options=division_options, index=0)
+    division = tuple(st.multiselect("Division", options=selector_options('Division'), placeholder="All Divisions"))
 
-# Filter regions based on selected division
+# Filter regions based on selected divisions
 with col2:
-    if division == 'All Divisions':
-        region_options = ['All Regions'] + list(df['Region'].unique())
+    if not division:
+        region_options = selector_options('Region')
     else:
-        region_options = ['All Regions'] + list(df[df['Division'] == division]['Region'].unique())
-    region = st.selectbox("Region", options=region_options, index=0)
+        region_options = selector_options('Region', 'Division', division)
+    region = tuple(st.multiselect("Region", options=region_options, placeholder="All Regions"))
 
-# Filter markets based on selected region
+# Filter markets based on selected regions
 with col3:
-    if region == 'All Regions':
-        if division == 'All Divisions':
-            market_options = ['All Markets'] + list(df['Market'].unique())
+    if not region:
+        if not division:
+            market_options = selector_options('Market')
         else:
-            market_options = ['All Markets'] + list(df[df['Division'] == division]['Market'].unique())
+            market_options = selector_options('Market', 'Division', division)
     else:
-        market_options = ['All Markets'] + list(df[df['Region'] == region]['Market'].unique())
-    market = st.selectbox("Market", options=market_options, index=0)
+        market_options = selector_options('Market', 'Region', region)
+    market = tuple(st.multiselect("Market", options=market_options, placeholder="All Markets"))
 
 # Filter branches based on selections
 with col4:
-    if market == 'All Markets':
-        if region == 'All Regions':
-            if division == 'All Divisions':
-                branch_options = ['All Branches'] + list(df['Branch'].unique())
+    if not market:
+        if not region:
+            if not division:
+                branch_options = selector_options('Branch')
             else:
-                branch_options = ['All Branches'] + list(df[df['Division'] == division]['Branch'].unique())
+                branch_options = selector_options('Branch', 'Division', division)
         else:
-            branch_options = ['All Branches'] + list(df[df['Region'] == region]['Branch'].unique())
+            branch_options = selector_options('Branch', 'Region', region)
     else:
-        branch_options = ['All Branches'] + list(df[df['Market'] == market]['Branch'].unique())
-    branch = st.selectbox("Branch", options=branch_options, index=0)
+        branch_options = selector_options('Branch', 'Market', market)
+    branch = tuple(st.multiselect("Branch", options=branch_options, placeholder="All Branches"))
 
 with col6:
     st.button("Export to PDF")
 
-# Get filtered data
-def get_filtered_data():
-    """Get filtered dataframe based on selected filters"""
-    filtered_df = df.copy()
-    
-    # Apply filters only if specific selections are made
-    if division != 'All Divisions':
-        filtered_df = filtered_df[filtered_df['Division'] == division]
-    if region != 'All Regions':
-        filtered_df = filtered_df[filtered_df['Region'] == region]
-    if market != 'All Markets':
-        filtered_df = filtered_df[filtered_df['Market'] == market]
-    if branch != 'All Branches':
-        filtered_df = filtered_df[filtered_df['Branch'] == branch]
-    
-    # Show message if no specific selections are made
-    if all(x.startswith('All') for x in [division, region, market, branch]):
-        st.info("👆 Select specific Division, Region, Market, or Branch to filter the data.")
-    
-    return filtered_df
+@st.cache_resource(max_entries=8, hash_funcs=FRAME_HASH_FUNCS)
+def load_metric_cube(df):
+    """
+    Leaf moments of one dataset version, built once and merged per selection on lookup
+    """
+    return build_metric_cube(df)
+
+def compute_selection_summary(version, division, region, market, branch):
+    """Summary of the rows matching the selected filters, from the cube or the SQL backend"""
+    digest, data = version
+    if data is None:
+        return summarize_frame(pd.DataFrame())
+    if DATA_BACKEND == 'sql':
+        return sql_backend.summarize(data, {'Division': division, 'Region': region, 'Market': market, 'Branch': branch})
+    if data.empty:
+        return summarize_frame(data)
+    return cube_summary(load_metric_cube(data), [division, region, market, branch])
+
+def selection_summary(version, is_actual, division, region, market, branch):
+    """Selection summary through the cross-session result cache, keyed on the version's digest"""
+    digest, data = version
+    if data is None:
+        # Nothing to key on; current_version has reported the missing file
+        return compute_selection_summary(version, division, region, market, branch)
+    return cached_result(
+        ('summary', digest, division, region, market, branch, is_actual, False),
+        lambda: compute_selection_summary(version, division, region, market, branch)
+    )
+
+@st.cache_resource(max_entries=8, hash_funcs=FRAME_HASH_FUNCS)
+def load_filter_index(df):
+    """
+    Hierarchy value -> row positions for one dataset version
+    """
+    return build_filter_index(df)
+
+def selection_rank(version, is_actual, division, region, market, branch):
+    """
+    In-scope rank of a selection holding a single branch: dense rank and percentile of its
+    overall score within its peer group among the Division/Region/Market selection.
+    None when the selection holds several branches. Ranks are cached once per scope.
+    """
+    scope = {'Division': division, 'Region': region, 'Market': market}
+    filters = dict(scope, Branch=branch)
+    digest, data = version
+    if data is None:
+        return None
+    if DATA_BACKEND == 'sql':
+        return cached_result(
+            ('rank', digest, division, region, market, branch, is_actual, False),
+            lambda: sql_backend.scope_rank(data, scope, filters, OVERALL_SCORE_COLUMN)
+        )
 
-# Get filtered data
-filtered_df = get_filtered_data()
+    if data.empty:
+        return None
+    index = load_filter_index(data)
+    selected = select_rows(index, filters)
+    if (len(data) if selected is None else len(selected)) != 1:
+        return None
+    positions = select_rows(index, scope)
+    ranks = cached_result(
+        ('scope_ranks', digest, division, region, market, None, is_actual, False),
+        lambda: scope_ranks(data, positions)
+    )
+    return row_rank(ranks, 0 if selected is None else int(selected[0]))
+
+def comparison_ranks(versions, division, region, market, branch):
+    """
+    selection_rank for each compared version, scoped by the same selection
+    """
+    scope_frames = load_comparison_rows(versions, division, region, market, ())
+    selected_frames = load_comparison_rows(versions, division, region, market, branch)
+    ranks = []
+    for scope_frame, selected in zip(scope_frames, selected_frames):
+        if len(selected) != 1 or 'Branch' not in selected.columns:
+            ranks.append(None)
+            continue
+        frame_ranks = cached_result(
+            ('scope_ranks', frame_fingerprint(scope_frame), division, region, market, None, False, True),
+            lambda: scope_ranks(scope_frame)
+        )
+        position = np.flatnonzero((scope_frame['Branch'] == selected['Branch'].iloc[0]).to_numpy())
+        ranks.append(row_rank(frame_ranks, int(position[0])) if len(position) else None)
+    return tuple(ranks)
+
+# Show message if no specific selections are made
+if not any([division, region, market, branch]):
+    st.info("👆 Select specific Division, Region, Market, or Branch to filter the data.")
 
 # Get filtered comparison data if debug mode is enabled
 if debug_compare and current_df is not None and previous_df is not None:
-    filtered_current_df = current_df.copy()
-    filtered_previous_df = previous_df.copy()
-    
-    # Apply filters to comparison data
-    if division != 'All Divisions':
-        filtered_current_df = filtered_current_df[filtered_current_df['Division'] == division]
-        if 'Division' in filtered_previous_df.columns:
-            filtered_previous_df = filtered_previous_df[filtered_previous_df['Division'] == division]
-    if region != 'All Regions':
-        filtered_current_df = filtered_current_df[filtered_current_df['Region'] == region]
-        if 'Region' in filtered_previous_df.columns:
-            filtered_previous_df = filtered_previous_df[filtered_previous_df['Region'] == region]
-    if market != 'All Markets':
-        filtered_current_df = filtered_current_df[filtered_current_df['Market'] == market]
-        if 'Market' in filtered_previous_df.columns:
-            filtered_previous_df = filtered_previous_df[filtered_previous_df['Market'] == market]
-    if branch != 'All Branches':
-        filtered_current_df = filtered_current_df[filtered_current_df['Branch'] == branch]
-        if 'Branch' in filtered_previous_df.columns:
-            filtered_previous_df = filtered_previous_df[filtered_previous_df['Branch'] == branch]
+    filtered_current_df, filtered_previous_df = load_comparison_rows(comparison_versions, division, region, market, branch)
+    compared_ranks = comparison_ranks(comparison_versions, division, region, market, branch)
 else:
     filtered_current_df = None
     filtered_previous_df = None
+    compared_ranks = None
 
 # Display comparison info if debug mode is enabled
 if debug_compare:
@@ -202,6 +368,13 @@ if debug_compare:
         <p>Format: <strong>Current Value</strong> (<span class="previous-value">Previous Value</span> → <span class="positive-delta">+Change</span> or <span class="negative-delta">-Change</span>)</p>
     </div>
     """, unsafe_allow_html=True)
+    cache_stats = result_cache_stats()
+    st.caption(f"Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+               f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 2**20:.1f} MB, {cache_stats['evictions']} evicted)")
+    for name, stats in reload_stats().items():
+        duration = 'n/a' if stats['last_reload_seconds'] is None else f"{stats['last_reload_seconds']:.2f}s"
+        st.caption(f"{name}: version {stats['version']}, {stats['reloads']} reloads (last {duration}), "
+                   f"{stats['waiting']} waiting (max {stats['max_waiting']}), {stats['stale_served']} stale reads")
 
 # Function to create delta indicator HTML
 def create_delta_indicator(current_value, previous_value, format_as_percent=True):
@@ -232,227 +405,214 @@ def create_delta_indicator(current_value, previous_value, format_as_percent=True
     return html
 
 # Calculate PL distribution
-def calculate_pl_distribution(filtered_df):
+def calculate_pl_distribution(summary):
     """
-    Calculate PL distribution for the filtered dataset
-    If all filters are "All", uses complete dataset
-    Otherwise uses filtered dataset
+    Calculate PL distribution for the current selection from its scope summary
+    If all filters are "All", this covers the complete dataset
     """
     try:
-        # Use filtered data for calculation
-        total_branches = len(filtered_df)
-        if total_branches == 0:
-            return "N/A"
-        
-        # Calculate PL distributions
-        pl_12_count = len(filtered_df[filtered_df['Performance_Level'].isin([1, 2])])
-        pl_56_count = len(filtered_df[filtered_df['Performance_Level'].isin([5, 6])])
-        
-        pl_12_pct = (pl_12_count / total_branches) * 100
-        pl_56_pct = (pl_56_count / total_branches) * 100
-        
-        return f"{pl_12_pct:.1f}% / {pl_56_pct:.1f}%"
+        return format_pl_distribution(summary)
     except Exception as e:
         st.error(f"Error calculating PL distribution: {str(e)}")
         return "N/A"
 
-# Display main metrics
-col1, col2, col3 = st.columns(3)
-with col1:
-    if debug_compare and filtered_current_df is not None and filtered_previous_df is not None:
-        try:
-            current_score = filtered_current_df['gofirsttime-wt'].mean()
-            previous_score = filtered_previous_df['gofirsttime-wt'].mean() if 'gofirsttime-wt' in filtered_previous_df.columns else 0
-            delta = current_score - previous_score
-            delta_class = "positive-delta" if delta >= 0 else "negative-delta"
+@st.fragment
+def render_scorecard(division, region, market, branch, debug_compare, filtered_current_df, filtered_previous_df,
+                     compared_ranks):
+    """
+    Headline tiles and metric boxes for one selection. Runs as a fragment: toggling
+    "Show Actual" reruns only this section, and everything it reads is passed in.
+    """
+    show_actual = st.checkbox("Show Actual", key="show_actual")
+
+    # Summarise the selection for the headline tiles and metric boxes, all from one version
+    version = current_version(show_actual)
+    summary = selection_summary(version, show_actual, division, region, market, branch)
+
+    comparing = debug_compare and filtered_current_df is not None and filtered_previous_df is not None
+    if comparing:
+        # Every column the tiles and metric boxes average and the PL histogram, once per version
+        current_means, previous_means = column_means([filtered_current_df, filtered_previous_df])
+        current_pl, previous_pl = pl_histogram(filtered_current_df), pl_histogram(filtered_previous_df)
+
+    # Display main metrics
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if comparing:
+            try:
+                current_score = current_means[OVERALL_SCORE_COLUMN]
+                previous_score = previous_means.get(OVERALL_SCORE_COLUMN, 0)
+                delta = current_score - previous_score
+                delta_class = "positive-delta" if delta >= 0 else "negative-delta"
             
-            delta_display = f"<br><small>(<span class='previous-value'>{previous_score:.2f}%</span> → <span class='{delta_class}'>{delta:+.2f}%</span>)</small>"
-            st.markdown(create_metric_box("Overall Weighted Score", f"{current_score:.2f}%{delta_display}"), unsafe_allow_html=True)
-        except Exception as e:
-            overall_score = filtered_df['gofirsttime-wt'].mean()
+                delta_display = f"<br><small>(<span class='previous-value'>{previous_score:.2f}%</span> → <span class='{delta_class}'>{delta:+.2f}%</span>)</small>"
+                st.markdown(create_metric_box("Overall Weighted Score", f"{current_score:.2f}%{delta_display}"), unsafe_allow_html=True)
+            except Exception as e:
+                overall_score = summary['means'][OVERALL_SCORE_COLUMN]
+                st.markdown(create_metric_box("Overall Weighted Score", f"{overall_score:.2f}%"), unsafe_allow_html=True)
+        else:
+            overall_score = summary['means'][OVERALL_SCORE_COLUMN]
             st.markdown(create_metric_box("Overall Weighted Score", f"{overall_score:.2f}%"), unsafe_allow_html=True)
-    else:
-        overall_score = filtered_df['gofirsttime-wt'].mean()
-        st.markdown(create_metric_box("Overall Weighted Score", f"{overall_score:.2f}%"), unsafe_allow_html=True)
 
-with col2:
-    if debug_compare and filtered_current_df is not None and filtered_previous_df is not None:
-        try:
-            current_rank = filtered_current_df['overall_rank'].iloc[0] if not filtered_current_df.empty else "N/A"
-            previous_rank = filtered_previous_df['overall_rank'].iloc[0] if not filtered_previous_df.empty and 'overall_rank' in filtered_previous_df.columns else "N/A"
-            
-            if current_rank != "N/A" and previous_rank != "N/A":
-                current_rank = int(current_rank)
-                previous_rank = int(previous_rank)
-                delta_rank = current_rank - previous_rank
-                delta_class = "positive-delta" if delta_rank <= 0 else "negative-delta"
+    with col2:
+        if comparing:
+            try:
+                current_rank, previous_rank = compared_ranks
+                if current_rank is not None and previous_rank is not None:
+                    delta_rank = current_rank['rank'] - previous_rank['rank']
+                    delta_class = "positive-delta" if delta_rank <= 0 else "negative-delta"
                 
-                delta_display = f"<br><small>(<span class='previous-value'>{previous_rank}</span> → <span class='{delta_class}'>{delta_rank:+}</span>)</small>"
-            else:
-                delta_display = ""
+                    delta_display = f"<br><small>(<span class='previous-value'>{previous_rank['rank']} of {previous_rank['of']}</span> → <span class='{delta_class}'>{delta_rank:+}</span>)</small>"
+                else:
+                    delta_display = ""
             
-            st.markdown(create_metric_box("Overall Rank", f"{current_rank}{delta_display}"), unsafe_allow_html=True)
-        except Exception as e:
-            rank = filtered_df['overall_rank'].iloc[0] if not filtered_df.empty else "N/A"
-            st.markdown(create_metric_box("Overall Rank", rank), unsafe_allow_html=True)
-    else:
-        rank = filtered_df['overall_rank'].iloc[0] if not filtered_df.empty else "N/A"
-        st.markdown(create_metric_box("Overall Rank", rank), unsafe_allow_html=True)
+                st.markdown(create_metric_box("Overall Rank", f"{format_rank(current_rank, len(filtered_current_df))}{delta_display}"), unsafe_allow_html=True)
+            except Exception as e:
+                rank = selection_rank(version, show_actual, division, region, market, branch)
+                st.markdown(create_metric_box("Overall Rank", format_rank(rank, summary['row_count'])), unsafe_allow_html=True)
+        else:
+            rank = selection_rank(version, show_actual, division, region, market, branch)
+            st.markdown(create_metric_box("Overall Rank", format_rank(rank, summary['row_count'])), unsafe_allow_html=True)
 
-with col3:
-    if debug_compare and filtered_current_df is not None and filtered_previous_df is not None:
-        try:
-            # Calculate for previous data
-            total_branches_prev = len(filtered_previous_df)
-            if total_branches_prev > 0 and 'Performance_Level' in filtered_previous_df.columns:
-                pl_12_count_prev = len(filtered_previous_df[filtered_previous_df['Performance_Level'].isin([1, 2])])
-                pl_56_count_prev = len(filtered_previous_df[filtered_previous_df['Performance_Level'].isin([5, 6])])
-                
-                pl_12_pct_prev = (pl_12_count_prev / total_branches_prev) * 100
-                pl_56_pct_prev = (pl_56_count_prev / total_branches_prev) * 100
-            else:
-                pl_12_pct_prev = 0
-                pl_56_pct_prev = 0
-                
-            # Calculate for current data
-            total_branches_curr = len(filtered_current_df)
-            if total_branches_curr > 0:
-                pl_12_count_curr = len(filtered_current_df[filtered_current_df['Performance_Level'].isin([1, 2])])
-                pl_56_count_curr = len(filtered_current_df[filtered_current_df['Performance_Level'].isin([5, 6])])
-                
-                pl_12_pct_curr = (pl_12_count_curr / total_branches_curr) * 100
-                pl_56_pct_curr = (pl_56_count_curr / total_branches_curr) * 100
-            else:
-                pl_12_pct_curr = 0
-                pl_56_pct_curr = 0
-                
-            pl_12_delta = pl_12_pct_curr - pl_12_pct_prev
-            pl_56_delta = pl_56_pct_curr - pl_56_pct_prev
-            
-            pl_12_delta_class = "positive-delta" if pl_12_delta >= 0 else "negative-delta"
-            pl_56_delta_class = "positive-delta" if pl_56_delta >= 0 else "negative-delta"
-            
-            pl_display = f"{pl_12_pct_curr:.1f}% / {pl_56_pct_curr:.1f}% <br><small>(<span class='previous-value'>{pl_12_pct_prev:.1f}% / {pl_56_pct_prev:.1f}%</span> → <span class='{pl_12_delta_class}'>{pl_12_delta:+.1f}%</span> / <span class='{pl_56_delta_class}'>{pl_56_delta:+.1f}%</span>)</small>"
+    with col3:
+        if comparing:
+            try:
+                current_shares = pl_bucket_shares(current_pl, len(filtered_current_df))
+                previous_shares = pl_bucket_shares(previous_pl, len(filtered_previous_df))
+                deltas = []
+                for label, share in current_shares.items():
+                    delta = share - previous_shares[label]
+                    delta_class = "positive-delta" if delta >= 0 else "negative-delta"
+                    deltas.append(f"<span class='{delta_class}'>{delta:+.1f}%</span>")
+
+                current_display = " / ".join(f"{share:.1f}%" for share in current_shares.values())
+                previous_display = " / ".join(f"{share:.1f}%" for share in previous_shares.values())
+                pl_display = f"{current_display} <br><small>(<span class='previous-value'>{previous_display}</span> → {' / '.join(deltas)})</small>"
             
-            st.markdown(create_metric_box_0("% of Branches in PL 1/2 vs. PL 5/6", pl_display), unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Error in PL calculation: {str(e)}")
-            pl_dist = calculate_pl_distribution(filtered_df)
-            st.markdown(create_metric_box_0("% of Branches in PL 1/2 vs. PL 5/6", pl_dist), unsafe_allow_html=True)
-    else:
-        pl_dist = calculate_pl_distribution(filtered_df)
-        st.markdown(create_metric_box_0("% of Branches in PL 1/2 vs. PL 5/6", pl_dist), unsafe_allow_html=True)
+                st.markdown(create_metric_box_0(pl_bucket_title(), pl_display), unsafe_allow_html=True)
+            except Exception as e:
+                st.error(f"Error in PL calculation: {str(e)}")
+                pl_dist = calculate_pl_distribution(summary)
+                st.markdown(create_metric_box_0(pl_bucket_title(), pl_dist), unsafe_allow_html=True)
+        else:
+            pl_dist = calculate_pl_distribution(summary)
+            st.markdown(create_metric_box_0(pl_bucket_title(), pl_dist), unsafe_allow_html=True)
 
-# Display performance metrics with comparison data if debug mode is enabled
-col1, col2, col3, col4, col5 = st.columns(5)
-columns = [col1, col2, col3, col4, col5]
+    # Display performance metrics with comparison data if debug mode is enabled
+    col1, col2, col3, col4, col5 = st.columns(5)
+    columns = [col1, col2, col3, col4, col5]
 
-for i, (metric, config) in enumerate(METRICS_CONFIG.items()):
-    with columns[i]:
-        if debug_compare and filtered_current_df is not None and filtered_previous_df is not None:
-            try:
-                current_value = filtered_current_df[config['score_column']].mean() if config['score_column'] in filtered_current_df.columns else 0
-                previous_value = filtered_previous_df[config['score_column']].mean() if config['score_column'] in filtered_previous_df.columns else 0
+    for i, (metric, config) in enumerate(METRICS_CONFIG.items()):
+        with columns[i]:
+            if comparing:
+                try:
+                    current_value = current_means.get(config['score_column'], 0)
+                    previous_value = previous_means.get(config['score_column'], 0)
                 
-                delta = current_value - previous_value
-                delta_text = f"{delta:+.2f}%"
-                delta_class = "positive-delta" if delta >= 0 else "negative-delta"
+                    delta = current_value - previous_value
+                    delta_text = f"{delta:+.2f}%"
+                    delta_class = "positive-delta" if delta >= 0 else "negative-delta"
                 
-                fill_percentage = min((current_value / config['max_value']) * 100, 100)
+                    fill_percentage = min((current_value / config['max_value']) * 100, 100)
                 
-                comparison_html = f"""
-                <div class="metric-percentage">{current_value:.2f}% <br><small>(<span class="previous-value">{previous_value:.2f}%</span> → <span class="{delta_class}">{delta_text}</span>)</small></div>
-                """
+                    comparison_html = f"""
+                    <div class="metric-percentage">{current_value:.2f}% <br><small>(<span class="previous-value">{previous_value:.2f}%</span> → <span class="{delta_class}">{delta_text}</span>)</small></div>
+                    """
                 
-                # Calculate comparison values
-                comparisons = {
-                    key: calculate_comparison(filtered_current_df, col) 
-                    for key, col in config['comparison_columns'].items()
-                }
-            except Exception as e:
-                value = filtered_df[config['score_column']].mean() if config['score_column'] in filtered_df.columns else 0
-                fill_percentage = min((value / config['max_value']) * 100, 100)
+                    # Calculate comparison values
+                    comparisons = {
+                        key: format_comparison(current_means.get(col))
+                        for key, col in config['comparison_columns'].items()
+                    }
+                except Exception as e:
+                    value = summary['means'].get(config['score_column'], 0)
+                    fill_percentage = min((value / config['max_value']) * 100, 100)
                 
+                    comparisons = {
+                        key: format_comparison(summary['means'].get(col)) 
+                        for key, col in config['comparison_columns'].items()
+                    }
+                
+                    comparison_html = f"""
+                    <div class="metric-percentage">{value:.2f}%</div>
+                    """
+            else:
+                value = summary['means'].get(config['score_column'], 0)
+                fill_percentage = min((value / config['max_value']) * 100, 100)
+            
                 comparisons = {
-                    key: calculate_comparison(filtered_df, col) 
+                    key: format_comparison(summary['means'].get(col)) 
                     for key, col in config['comparison_columns'].items()
                 }
-                
+            
                 comparison_html = f"""
-                <div class="metric-percentage">{value:.2f}%</div>
+                <div class="metric-percentage" title="{format_spread(summary, config['score_column'])}">{value:.2f}%</div>
                 """
-        else:
-            value = filtered_df[config['score_column']].mean() if config['score_column'] in filtered_df.columns else 0
-            fill_percentage = min((value / config['max_value']) * 100, 100)
-            
-            comparisons = {
-                key: calculate_comparison(filtered_df, col) 
-                for key, col in config['comparison_columns'].items()
-            }
-            
-            comparison_html = f"""
-            <div class="metric-percentage">{value:.2f}%</div>
-            """
         
-        st.markdown(f"""
-        <div class="metric-box">
-            <div class="metric-title" style="font-weight: 600;">{metric}</div>
-            {comparison_html}
-            <div class="progress-container">
-                <div class="progress-bar" style="width: {fill_percentage}%; background-color: {config['color']};"></div>
-            </div>
-            <div class="comparison-section">
-                <div class="comparison-labels">
-                    <span>vs Last month</span>
-                    <span>Peer group</span>
-                    <span>National</span>
+            st.markdown(f"""
+            <div class="metric-box">
+                <div class="metric-title" style="font-weight: 600;">{metric}</div>
+                {comparison_html}
+                <div class="progress-container">
+                    <div class="progress-bar" style="width: {fill_percentage}%; background-color: {config['color']};"></div>
                 </div>
-                <div class="comparison-values">
-                    {create_comparison_metric(comparisons['vs_last'])}
-                    {create_comparison_metric(comparisons['peer'])}
-                    {create_comparison_metric(comparisons['national'])}
+                <div class="comparison-section">
+                    <div class="comparison-labels">
+                        <span>vs Last month</span>
+                        <span>Peer group</span>
+                        <span>National</span>
+                    </div>
+                    <div class="comparison-values">
+                        {create_comparison_metric(comparisons['vs_last'])}
+                        {create_comparison_metric(comparisons['peer'])}
+                        {create_comparison_metric(comparisons['national'])}
+                    </div>
                 </div>
             </div>
-        </div>
-        """, unsafe_allow_html=True)
+            """, unsafe_allow_html=True)
+
+    st.divider()
 
-st.divider()
+render_scorecard(division, region, market, branch, debug_compare, filtered_current_df, filtered_previous_df,
+                 compared_ranks)
 
 
-# # Display impact analysis if debug mode is enabled
-if debug_compare and filtered_current_df is not None and filtered_previous_df is not None:
+def compute_impact_analysis(versions, division, region, market, branch):
+    current, previous = load_comparison_rows(versions, division, region, market, branch)
+    impact_tables = {
+        'Growth': create_impact_table(current, previous, 'growth', TABLE_CONFIGS['growth']),
+        'Customer': create_impact_table(current, previous, 'customer', TABLE_CONFIGS['customer']),
+        'Financial': create_impact_table(current, previous, 'financial', TABLE_CONFIGS['financial']),
+        'Controls': create_impact_table(current, previous, 'controls', TABLE_CONFIGS['controls'])
+    }
+    # generate_impact_summary tags the tables it is given with a Category column
+    top_positive, top_negative = generate_impact_summary({name: table.copy() for name, table in impact_tables.items()})
+    return impact_tables, top_positive, top_negative
+
+def load_impact_analysis(versions, division, region, market, branch):
+    """
+    Impact tables and the top positive/negative changes for one comparison and selection,
+    computed once and reused by every session (and every rerun) that asks for them
+    """
+    return cached_result(
+        ('impact_analysis', comparison_fingerprint(versions), division, region, market, branch, False, True),
+        lambda: compute_impact_analysis(versions, division, region, market, branch)
+    )
+
+@st.fragment
+def render_impact_analysis(versions, division, region, market, branch):
+    """Impact analysis tabs and summary; a fragment with explicit inputs like render_scorecard"""
     # Create tabs for impact analysis
     st.markdown("## Impact Analysis")
     st.markdown("This analysis shows how changes in each metric contribute to the overall scorecard changes.")
     
     try:
+        impact_tables, top_positive, top_negative = load_impact_analysis(versions, division, region, market, branch)
         impact_tabs = st.tabs(["Growth & One Chase", "Customer Experience", "Financial Health & Innovation", "Controls"])
         
-        # Store impact tables for summary
-        impact_tables = {}
-        
-        with impact_tabs[0]:
-            growth_impact = create_impact_table(filtered_current_df, filtered_previous_df, 'growth', TABLE_CONFIGS['growth'])
-            st.dataframe(style_impact_table(growth_impact), hide_index=True, use_container_width=True)
-            impact_tables['Growth'] = growth_impact
-        
-        with impact_tabs[1]:
-            customer_impact = create_impact_table(filtered_current_df, filtered_previous_df, 'customer', TABLE_CONFIGS['customer'])
-            st.dataframe(style_impact_table(customer_impact), hide_index=True, use_container_width=True)
-            impact_tables['Customer'] = customer_impact
-        
-        with impact_tabs[2]:
-            financial_impact = create_impact_table(filtered_current_df, filtered_previous_df, 'financial', TABLE_CONFIGS['financial'])
-            st.dataframe(style_impact_table(financial_impact), hide_index=True, use_container_width=True)
-            impact_tables['Financial'] = financial_impact
-        
-        with impact_tabs[3]:
-            controls_impact = create_impact_table(filtered_current_df, filtered_previous_df, 'controls', TABLE_CONFIGS['controls'])
-            st.dataframe(style_impact_table(controls_impact), hide_index=True, use_container_width=True)
-            impact_tables['Controls'] = controls_impact
-        
-        # Create impact summary
-        top_positive, top_negative = generate_impact_summary(impact_tables)
+        for tab, name in zip(impact_tabs, ['Growth', 'Customer', 'Financial', 'Controls']):
+            with tab:
+                st.dataframe(style_impact_table(impact_tables[name]), hide_index=True, use_container_width=True)
         
         if not top_positive.empty or not top_negative.empty:
             st.markdown("""
@@ -483,3 +643,7 @@ if debug_compare and filtered_current_df is not None and filtered_previous_df is
         st.error(f"Error in impact analysis: {str(e)}")
     
     st.divider()
+
+# # Display impact analysis if debug mode is enabled
+if debug_compare and filtered_current_df is not None and filtered_previous_df is not None:
+    render_impact_analysis(comparison_versions, division, region, market, branch)
@@ -0,0 +1,57 @@
+# bench_isin.py
+
+"""
+Timings of the selector membership step: filter_engine.isin_mask against Series.isin
+and np.isin on the codes, for categorical columns shaped like the long-format
+selectors. Run with `python bench_isin.py [rows]`.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from filter_engine import isin_mask
+
+SELECTION_SIZES = [1, 5, 10, 50]
+# (label, distinct values): a Division-like and a Branch_Name-like column
+COLUMN_SHAPES = [('division', 8), ('region', 100), ('branch', 20000)]
+
+
+def best_ms(func, number=10, repeat=5):
+    """
+    Best average milliseconds per call over `repeat` runs of `number` calls
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1000
+
+
+def bench_column(rows, distinct, rng):
+    """
+    One result row per selection size for a categorical column of `distinct` values
+    """
+    categories = [f"value_{i}" for i in range(distinct)]
+    series = pd.Series(pd.Categorical.from_codes(rng.integers(0, distinct, rows), categories))
+    codes = series.cat.codes.to_numpy()
+    results = []
+    for size in SELECTION_SIZES:
+        if size > distinct:
+            continue
+        values = [categories[i] for i in rng.choice(distinct, size, replace=False)]
+        wanted = series.cat.categories.get_indexer(values)
+        assert (isin_mask(series, values) == series.isin(values).to_numpy()).all()
+        results.append({
+            'selected': size,
+            'isin_mask': best_ms(lambda: isin_mask(series, values)),
+            'Series.isin': best_ms(lambda: series.isin(values).to_numpy()),
+            'np.isin(codes)': best_ms(lambda: np.isin(codes, wanted))
+        })
+    return results
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    for label, distinct in COLUMN_SHAPES:
+        print(f"\n{label}: {rows:,} rows, {distinct:,} distinct values (ms per mask)")
+        print(pd.DataFrame(bench_column(rows, distinct, rng)).set_index('selected').round(2).to_string())
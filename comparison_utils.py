@@ -3,13 +3,22 @@
 import pandas as pd
 import streamlit as st
 
+from schema import projected_columns
+from snapshot_store import load_snapshot
+from snapshot_history import list_periods, load_period
+
 def load_data_versions():
     """
-    Load both the current and previous versions of the data
+    Load both the current and previous versions of the data.
+    Uses the two latest recorded periods when a snapshot history exists.
     """
     try:
-        current_data = pd.read_csv('branch_data.csv')
-        previous_data = pd.read_csv('branch_data_previous.csv')
+        periods = list_periods()
+        if len(periods) >= 2:
+            return (load_period(periods[-1], columns=projected_columns()),
+                    load_period(periods[-2], columns=projected_columns()))
+        current_data = load_snapshot('branch_data.csv', columns=projected_columns())
+        previous_data = load_snapshot('branch_data_previous.csv', columns=projected_columns())
         return current_data, previous_data
     except Exception as e:
         st.error(f"Error loading comparison data: {str(e)}")
@@ -1,11 +1,24 @@
+import os
 import streamlit as st
 import pandas as pd
 from dashboard_styles import get_dashboard_styles
+from config import LONG_DATA_PATH, LONG_DATASET_DIR, LONG_STREAMING
+from snapshot_store import FRAME_HASH_FUNCS, file_digest, ingest_workbook, load_workbook_snapshot, restore_fingerprint
+from partitioned_store import dataset_version, list_partitions, load_partitions
+from periods import sort_periods
 from data_processor import (
     load_and_filter_data, 
+    filter_long_data,
     calculate_main_metrics, 
     calculate_category_metrics,
-    get_subcategory_metrics
+    calculate_filtered_metrics,
+    category_metrics_from_sums,
+    get_subcategory_metrics,
+    stream_partial_sums,
+    subcategory_summary,
+    subcategory_summary_from_partials,
+    BRANCH_COLUMNS,
+    CATEGORY_COLORS
 )
 
 # Set page configuration
@@ -18,67 +31,122 @@ st.markdown(get_dashboard_styles(), unsafe_allow_html=True)
 st.markdown('<div class="blue-header"><h3>Consumer Banking Branch Manager Scorecard</h3></div>', unsafe_allow_html=True)
 
 @st.cache_data
-def load_data():
+def load_data(path, digest, columns=None):
+    """
+    Load the workbook through its columnar snapshot.
+    `digest` keys the cache on file contents so a replaced workbook is reloaded.
+    """
     try:
-        df = pd.read_excel('scorecard_data_long.xlsx')
+        df = load_workbook_snapshot(path, columns=columns)
         return df
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return pd.DataFrame()
 
-# Load initial data
-df = load_data()
+@st.cache_data
+def load_partitioned_data(root, version, division, scorecard_period, columns=None):
+    """
+    Load only the Division/period partitions matching the selectors.
+    `version` keys the cache on the dataset files so a rewrite is picked up.
+    """
+    try:
+        return load_partitions(root, division=division, scorecard_period=scorecard_period, columns=columns)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return pd.DataFrame()
+
+@st.cache_data(max_entries=256)
+def cached_partial_sums(source, version, scorecard_period, division, region, market, branch):
+    """
+    stream_partial_sums for one selection. `version` keys the cache on the source files.
+    """
+    return stream_partial_sums(source, scorecard_period=scorecard_period, division=division,
+                               region=region, market=market, branch=branch)
+
+# Prefer the partitioned dataset; fall back to the workbook when it hasn't been written
+use_partitions = os.path.isdir(LONG_DATASET_DIR)
+# In streaming mode the per-subcategory rows are never loaded as a frame
+frame_columns = tuple(BRANCH_COLUMNS) if LONG_STREAMING else None
+
+if use_partitions:
+    # Period and division options come from the partition directory names
+    partitions = list_partitions(LONG_DATASET_DIR)
+    scorecard_periods = sort_periods({period for _, period in partitions})
+    divisions = sorted({division for division, _ in partitions})
+else:
+    # Load initial data
+    try:
+        df = restore_fingerprint(load_data(LONG_DATA_PATH, file_digest(LONG_DATA_PATH), frame_columns))
+    except OSError as e:
+        st.error(f"Error loading data: {e}")
+        df = pd.DataFrame()
 
-if df.empty:
-    st.error("No data available. Please check if the data file exists.")
-    st.stop()
+    if df.empty:
+        st.error("No data available. Please check if the data file exists.")
+        st.stop()
 
-# Get unique values for filters
-scorecard_periods = ['All'] + sorted(df['Scorecard_Period'].unique().tolist())
-divisions = ['All'] + sorted(df['Division'].unique().tolist())
-regions = ['All'] + sorted(df['Region'].unique().tolist())
-markets = ['All Markets'] + sorted(df['Market'].unique().tolist())
-branches = ['All'] + sorted(df['Branch_Name'].unique().tolist())
+    scorecard_periods = sort_periods(df['Scorecard_Period'].unique().tolist())
+    divisions = sorted(df['Division'].unique().tolist())
 
-# Filters layout
+# Filters layout; every filter is a multi-select where an empty selection means "All".
+# Selections are tuples so they can key the cached loaders.
 col1, col2, col3, col4, spacing, col6, col7 = st.columns([1, 1, 1, 1, 0.3, 1, 1])
 
 with col1:
-    scorecard_period = st.selectbox("Scorecard Period", scorecard_periods)
+    scorecard_period = tuple(st.multiselect("Scorecard Period", scorecard_periods, placeholder="All"))
 with col2:
-    division = st.selectbox("Division", divisions)
+    division = tuple(st.multiselect("Division", divisions, placeholder="All"))
+
+if use_partitions:
+    df = restore_fingerprint(load_partitioned_data(LONG_DATASET_DIR, dataset_version(LONG_DATASET_DIR),
+                                                   division, scorecard_period, frame_columns))
+    if df.empty:
+        st.error("No data available. Please check if the data file exists.")
+        st.stop()
+
+# Get unique values for the remaining filters
+regions = sorted(df['Region'].unique().tolist())
+markets = sorted(df['Market'].unique().tolist())
+branches = sorted(df['Branch_Name'].unique().tolist())
+
 with col3:
-    region = st.selectbox("Region", regions)
+    region = tuple(st.multiselect("Region", regions, placeholder="All"))
 with col4:
-    market = st.selectbox("Market", markets)
+    market = tuple(st.multiselect("Market", markets, placeholder="All Markets"))
 with col6:
-    branch = st.selectbox("Branch", branches)
+    branch = tuple(st.multiselect("Branch", branches, placeholder="All"))
 with col7:
     st.button("Export to PDF")
 
 # Filter data based on selections
-def filter_data(df):
-    mask = pd.Series(True, index=df.index)
-    if scorecard_period != 'All':
-        mask &= df['Scorecard_Period'] == scorecard_period
-    if division != 'All':
-        mask &= df['Division'] == division
-    if region != 'All':
-        mask &= df['Region'] == region
-    if market != 'All Markets':
-        mask &= df['Market'] == market
-    if branch != 'All':
-        mask &= df['Branch_Name'] == branch
-    return df[mask]
-
-
-filtered_df = filter_data(df)
-
-if branch != 'All':
-    st.info(f"### Branch: {branch}")
+filtered_df = filter_long_data(df, scorecard_period=scorecard_period, division=division,
+                               region=region, market=market, branch=branch)
+
+if LONG_STREAMING:
+    # Category boxes and tables come from partial sums streamed off the Parquet data
+    try:
+        if use_partitions:
+            stream_source, stream_version = LONG_DATASET_DIR, dataset_version(LONG_DATASET_DIR)
+        else:
+            stream_source, stream_version = ingest_workbook(LONG_DATA_PATH), file_digest(LONG_DATA_PATH)
+        partial_sums = cached_partial_sums(stream_source, stream_version, scorecard_period, division,
+                                           region, market, branch)
+    except Exception as e:
+        st.error(f"Error streaming data: {e}")
+        st.stop()
+
+if len(branch) == 1:
+    st.info(f"### Branch: {branch[0]}")
+elif branch:
+    st.info(f"### Branches: {', '.join(branch)}")
+
+@st.cache_data(hash_funcs=FRAME_HASH_FUNCS, max_entries=256)
+def cached_main_metrics(filtered_df, reference_df):
+    """calculate_main_metrics keyed on the frames' fingerprints rather than their contents"""
+    return calculate_main_metrics(filtered_df, reference_df)
 
 # Calculate metrics
-main_metrics = calculate_main_metrics(filtered_df)
+main_metrics = cached_main_metrics(filtered_df, df)
 
 # Helper functions for creating metric boxes
 def create_metric_box(label, value):
@@ -139,99 +207,33 @@ def create_comparison_metric(value):
         st.warning(f"Error formatting comparison metric: {str(e)}")
         return f'<span>N/A</span>'
 
-def calculate_filtered_metrics(filtered_df):
-    metrics = {}
-    categories = [
-        ('Growth & One Chase', '#0052CC'),
-        ('Customer Experience', '#00A3BF'),
-        ('Financial Health & Innovation', '#36B37E'),
-        ('Culture & Employee', '#FF8B00'),
-        ('Controls', '#998DD9')
-    ]
-    
+def metric_error_boxes(error):
+    """Category boxes showing a metric calculation error"""
+    st.error(f"Error in metric calculations: {str(error)}")
+    return {category: {
+        "value": 0.0,
+        "color": color,
+        "vs_last": "Error",
+        "peer": "Error",
+        "national": "Error"
+    } for category, color in CATEGORY_COLORS.items()}
+
+@st.cache_data(hash_funcs=FRAME_HASH_FUNCS, max_entries=256)
+def cached_filtered_metrics(filtered_df):
+    """calculate_filtered_metrics keyed on the frame's fingerprint, with errors shown in the boxes"""
     try:
-        if filtered_df.empty:
-            return {category: {
-                "value": 0.0,
-                "color": color,
-                "vs_last": "0.0%",
-                "peer": "0.0%",
-                "national": "0.0%"
-            } for category, color in categories}
-        
-        all_periods = sorted(filtered_df['Scorecard_Period'].unique())
-        current_period = all_periods[-1] if all_periods else None
-        prev_period = all_periods[-2] if len(all_periods) > 1 else None
-
-        for category, color in categories:
-            try:
-                category_data = filtered_df[filtered_df['Category'] == category]
-                
-                if category_data.empty:
-                    metrics[category] = {
-                        "value": 0.0,
-                        "color": color,
-                        "vs_last": "0.0%",
-                        "peer": "0.0%",
-                        "national": "0.0%"
-                    }
-                    continue
-
-                current_data = category_data[category_data['Scorecard_Period'] == current_period] if current_period else pd.DataFrame()
-                current_value = current_data['Value'].mean() if not current_data.empty else 0.0
-
-                prev_data = category_data[category_data['Scorecard_Period'] == prev_period] if prev_period else pd.DataFrame()
-                prev_value = prev_data['Value'].mean() if not prev_data.empty else current_value
-
-                peer_group = current_data['Peer_Group'].iloc[0] if not current_data.empty else None
-                if peer_group:
-                    peer_data = filtered_df[
-                        (filtered_df['Category'] == category) & 
-                        (filtered_df['Peer_Group'] == peer_group)
-                    ]
-                    peer_avg = peer_data['Value'].mean() if not peer_data.empty else current_value
-                else:
-                    peer_avg = current_value
-
-                national_data = filtered_df[filtered_df['Category'] == category]
-                national_avg = national_data['Value'].mean() if not national_data.empty else current_value
-
-                vs_last = current_value - prev_value if prev_value is not None else 0.0
-                vs_peer = current_value - peer_avg if peer_avg is not None else 0.0
-                vs_national = current_value - national_avg if national_avg is not None else 0.0
-
-                metrics[category] = {
-                    "value": current_value,
-                    "color": color,
-                    "vs_last": f"{vs_last:+.1f}%",
-                    "peer": f"{vs_peer:+.1f}%",
-                    "national": f"{vs_national:+.1f}%"
-                }
-
-            except Exception as e:
-                st.warning(f"Error calculating metrics for {category}: {str(e)}")
-                metrics[category] = {
-                    "value": 0.0,
-                    "color": color,
-                    "vs_last": "N/A",
-                    "peer": "N/A",
-                    "national": "N/A"
-                }
-
+        return calculate_filtered_metrics(filtered_df)
     except Exception as e:
-        st.error(f"Error in metric calculations: {str(e)}")
-        return {category: {
-            "value": 0.0,
-            "color": color,
-            "vs_last": "Error",
-            "peer": "Error",
-            "national": "Error"
-        } for category, color in categories}
-
-    return metrics
+        return metric_error_boxes(e)
 
 # Calculate metrics after data is loaded and filtered
-category_metrics = calculate_filtered_metrics(filtered_df)
+if LONG_STREAMING:
+    try:
+        category_metrics = category_metrics_from_sums(partial_sums)
+    except Exception as e:
+        category_metrics = metric_error_boxes(e)
+else:
+    category_metrics = cached_filtered_metrics(filtered_df)
 
 # Then display the metrics
 col1, col2, col3, col4, col5 = st.columns(5)
@@ -268,17 +270,27 @@ st.divider()
 
 
 
+@st.cache_data(hash_funcs=FRAME_HASH_FUNCS, max_entries=256)
+def cached_subcategory_summary(filtered_df):
+    """subcategory_summary keyed on the frame's fingerprint, shared by every category table"""
+    return subcategory_summary(filtered_df)
+
+# Per-subcategory means behind the category tables, computed once per selection
+if LONG_STREAMING:
+    subcategory_table = subcategory_summary_from_partials(partial_sums)
+else:
+    subcategory_table = cached_subcategory_summary(filtered_df)
+
 # Function to create metrics table
-def create_metrics_table(filtered_df, category):
-    category_data = filtered_df[filtered_df['Category'] == category]
-    
-    if not category_data.empty:
+def create_metrics_table(summary, category):
+    if category in summary.index.get_level_values('Category'):
+        category_data = summary.loc[category]
         metrics_df = pd.DataFrame({
-            'Metric': category_data['Subcategory'].unique(),
-            'YTD Sep 24': category_data.groupby('Subcategory')['Value'].mean(),
-            'Metric Score': category_data.groupby('Subcategory')['Value'].mean(),
-            'Weight': category_data.groupby('Subcategory')['Weight'].first(),
-            'Weighted Score': category_data.groupby('Subcategory')['Weighted_Score'].mean()
+            'Metric': category_data.index,
+            'YTD Sep 24': category_data['Value'],
+            'Metric Score': category_data['Value'],
+            'Weight': category_data['Weight'],
+            'Weighted Score': category_data['Weighted_Score']
         }).reset_index(drop=True)
         
         # Format the columns
@@ -308,7 +320,7 @@ for i in range(0, len(categories), 2):
     with col1:
         if i < len(categories):
             st.subheader(categories[i])
-            metrics_df = create_metrics_table(filtered_df, categories[i])
+            metrics_df = create_metrics_table(subcategory_table, categories[i])
             if not metrics_df.empty:
                 st.dataframe(
                     metrics_df,
@@ -319,7 +331,7 @@ for i in range(0, len(categories), 2):
     with col2:
         if i + 1 < len(categories):
             st.subheader(categories[i + 1])
-            metrics_df = create_metrics_table(filtered_df, categories[i + 1])
+            metrics_df = create_metrics_table(subcategory_table, categories[i + 1])
             if not metrics_df.empty:
                 st.dataframe(
                     metrics_df,
@@ -330,7 +342,7 @@ for i in range(0, len(categories), 2):
 # Display last table if odd number of categories
 if len(categories) % 2 != 0:
     st.subheader(categories[-1])
-    metrics_df = create_metrics_table(filtered_df, categories[-1])
+    metrics_df = create_metrics_table(subcategory_table, categories[-1])
     if not metrics_df.empty:
         st.dataframe(
             metrics_df,
@@ -343,7 +355,7 @@ col1, col2 = st.columns(2)
 
 # Growth & One Chase table
 with col1:
-    metrics = get_subcategory_metrics(filtered_df, "Growth & One Chase")
+    metrics = get_subcategory_metrics(filtered_df, "Growth & One Chase", subcategory_table)
     metrics_html = "".join([f"""
                 <tr>
                     <td>{m['Metric']}</td>
@@ -376,7 +388,7 @@ with col1:
 
 # Customer Experience table
 with col2:
-    metrics = get_subcategory_metrics(filtered_df, "Customer Experience")
+    metrics = get_subcategory_metrics(filtered_df, "Customer Experience", subcategory_table)
     metrics_html = "".join([f"""
                 <tr>
                     <td>{m['Metric']}</td>
@@ -411,7 +423,7 @@ with col2:
 col3, col4 = st.columns(2)
  
 with col3:
-    metrics = get_subcategory_metrics(filtered_df, "Financial Health & Innovation")
+    metrics = get_subcategory_metrics(filtered_df, "Financial Health & Innovation", subcategory_table)
     metrics_html = "".join([f"""
                 <tr>
                     <td>{m['Metric']}</td>
@@ -443,7 +455,7 @@ with col3:
     """, unsafe_allow_html=True)
 
 with col4:
-    metrics = get_subcategory_metrics(filtered_df, "Culture & Employee")
+    metrics = get_subcategory_metrics(filtered_df, "Culture & Employee", subcategory_table)
     metrics_html = "".join([f"""
                 <tr>
                     <td>{m['Metric']}</td>
@@ -477,7 +489,7 @@ with col4:
 col5, col6 = st.columns(2)
 
 with col5:
-    metrics = get_subcategory_metrics(filtered_df, "Controls")
+    metrics = get_subcategory_metrics(filtered_df, "Controls", subcategory_table)
     metrics_html = "".join([f"""
                 <tr>
                     <td>{m['Metric']}</td>
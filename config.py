@@ -1,5 +1,43 @@
 # config.py
 
+# Directory holding the columnar snapshots built from the scorecard CSVs
+SNAPSHOT_DIR = '.snapshots'
+
+# Immutable per-period scorecard versions recorded with snapshot_history.py
+HISTORY_DIR = 'scorecard_history'
+
+# Where filtering and aggregation run for app.py: 'pandas' (in memory) or
+# 'sql' (pushed down to an embedded DuckDB, or SQLite when DuckDB is missing)
+DATA_BACKEND = 'pandas'
+
+# Embedded database file, without extension; the engine adds its own
+SQL_DB_PATH = '.snapshots/scorecard'
+
+# Memory budget of the per-selection result cache shared by every session (result_cache.py)
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Long-format scorecard workbook used by complete-app.py
+LONG_DATA_PATH = 'scorecard_data_long.xlsx'
+
+# Parquet dataset partitioned by Division and Scorecard_Period, written by the
+# data generators alongside the workbook
+LONG_DATASET_DIR = 'scorecard_data_long'
+
+# Build complete-app.py's category boxes and tables from partial sums streamed off the
+# long-format Parquet data (data_processor.stream_partial_sums, needs pyarrow) instead
+# of the filtered frame; only the branch-level headline columns are loaded as a frame
+LONG_STREAMING = False
+
+# Hierarchy columns behind the Division/Region/Market/Branch selectors
+HIERARCHY_COLUMNS = ['Division', 'Region', 'Market', 'Branch']
+
+# Columns read directly by the headline tiles
+HEADLINE_COLUMNS = ['gofirsttime-wt', 'overall_rank', 'Performance_Level', 'PG']
+
+# Performance_Level groupings compared by the PL headline tile, as label -> levels,
+# e.g. {'PL 1': (1,), 'PL 2-4': (2, 3, 4), 'PL 5-6': (5, 6)}
+PL_BUCKETS = {'PL 1/2': (1, 2), 'PL 5/6': (5, 6)}
+
 METRICS_CONFIG = {
     "Growth & One Chase (60%)": {
         "max_value": 60.0,
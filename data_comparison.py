@@ -1,61 +1,53 @@
 import pandas as pd
-import numpy as np
 import streamlit as st
 
-def load_comparison_data():
+from schema import projected_columns
+from snapshot_store import load_snapshot
+from snapshot_history import list_periods, load_period
+from filter_engine import filter_snapshots
+
+def load_comparison_data(current_period=None, previous_period=None):
     """
-    Load both current and previous versions of the scorecard data
+    Load two versions of the scorecard data
+    Recorded periods come from the snapshot history (latest and the one before it by default);
+    without a history, falls back to branch_data.csv and branch_data_previous.csv
     """
     try:
-        current_data = pd.read_csv('branch_data.csv')
-        previous_data = pd.read_csv('branch_data_previous.csv')
+        periods = list_periods()
+        if len(periods) >= 2:
+            current_period = current_period or periods[-1]
+            if current_period not in periods:
+                raise ValueError(f"Period {current_period} is not recorded")
+            if previous_period is None:
+                if periods.index(current_period) == 0:
+                    raise ValueError(f"No recorded period before {current_period}")
+                previous_period = periods[periods.index(current_period) - 1]
+            elif previous_period not in periods:
+                raise ValueError(f"Period {previous_period} is not recorded")
+            elif previous_period >= current_period:
+                # 'YYYY-MM' labels sort chronologically
+                raise ValueError(f"Period {previous_period} is not before {current_period}")
+            return (load_period(current_period, columns=projected_columns()),
+                    load_period(previous_period, columns=projected_columns()))
+
+        current_data = load_snapshot('branch_data.csv', columns=projected_columns())
+        previous_data = load_snapshot('branch_data_previous.csv', columns=projected_columns())
         return current_data, previous_data
     except Exception as e:
         st.error(f"Error loading comparison data: {str(e)}")
-        # If previous version doesn't exist, create a mock one from current with slightly different values
-        # This is just for demonstration purposes
         if 'branch_data_previous.csv' in str(e):
-            st.warning("Previous version data not found. Using simulated data for demonstration.")
-            current_data = pd.read_csv('branch_data.csv')
-            previous_data = current_data.copy()
-            
-            # Modify some values to simulate changes
-            for col in previous_data.columns:
-                if previous_data[col].dtype in [np.float64, np.int64]:
-                    # Add small random variations to numeric columns
-                    previous_data[col] = previous_data[col] * np.random.uniform(0.9, 1.1, len(previous_data))
-            
-            return current_data, previous_data
+            st.warning("Previous version data not found. Record periods with snapshot_history.py to compare versions.")
+            return load_snapshot('branch_data.csv', columns=projected_columns()), pd.DataFrame()
         return pd.DataFrame(), pd.DataFrame()
 
 def filter_comparison_data(current_df, previous_df, division, region, market, branch):
     """
-    Apply filters to both current and previous dataframes
+    Apply one filter plan to both current and previous dataframes
     """
-    filtered_current = current_df.copy()
-    filtered_previous = previous_df.copy()
-    
-    # Apply filters to both datasets
-    if division != 'All Divisions':
-        filtered_current = filtered_current[filtered_current['Division'] == division]
-        if 'Division' in filtered_previous.columns:
-            filtered_previous = filtered_previous[filtered_previous['Division'] == division]
-    
-    if region != 'All Regions':
-        filtered_current = filtered_current[filtered_current['Region'] == region]
-        if 'Region' in filtered_previous.columns:
-            filtered_previous = filtered_previous[filtered_previous['Region'] == region]
-    
-    if market != 'All Markets':
-        filtered_current = filtered_current[filtered_current['Market'] == market]
-        if 'Market' in filtered_previous.columns:
-            filtered_previous = filtered_previous[filtered_previous['Market'] == market]
-    
-    if branch != 'All Branches':
-        filtered_current = filtered_current[filtered_current['Branch'] == branch]
-        if 'Branch' in filtered_previous.columns:
-            filtered_previous = filtered_previous[filtered_previous['Branch'] == branch]
-    
+    filtered_current, filtered_previous = filter_snapshots(
+        [current_df, previous_df],
+        {'Division': division, 'Region': region, 'Market': market, 'Branch': branch}
+    )
     return filtered_current, filtered_previous
 
 def generate_impact_summary(impact_tables):
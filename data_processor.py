@@ -1,2 +1,320 @@
-Division	Region	Market	Branch	BranchManager	BranchType	PG	gototD&Ibalgrowrh	gonetcheckingaquistion	gofirsttime	gologin	gocredicard	cobranchosat	fhidigital	cuechase	controls	gototD&Ibalgrowrh-wt	gonetcheckingaquistion-wt	gofirsttime-wt	gologin-wt	gocredicard-wt	cobranchosat-wt	fhidigital-wt	cuechase-wt	controls-wt	overall_rank	Performance_Level	growth_score	customer_exp_score	financial_health_score	culture_score	growth_score	customer_exp_score	financial_health_score	culture_score	controls_score	nca_ytd	nca_score	banker_ytd	banker_score	discover_ytd	discover_score	investors_ytd	investors_score	loan_ytd	loan_score	cc_ytd	cc_score	dda_ytd	dda_score	osat_ytd	osat_score	digital_ytd	digital_score	health_ytd	health_score	risk_ytd	risk_score	compliance_ytd	compliance_score
-West	Indiana	Market A	Branch1	nam	ss	1	0.54	0.55	0.22	0.12	0.97	0.61	0.04	0.29	0.13	0.05	0.76	0.63	0.64	0	0.67	0.95	0.98	0.75	1	3	54.3	11	86.2	622.9	37	9	5	1	4	76	26	98	99	59	85	63	48	56	50	18	16	38	36	42	63	75	38	22	80	3	2	52	25
+# data_processor.py
+
+import numpy as np
+import pandas as pd
+
+from config import LONG_DATA_PATH, LONG_DATASET_DIR
+from filter_engine import selected_values, isin_mask
+from periods import build_period_index, period_window, window_mask
+from snapshot_store import load_workbook_snapshot, tag_selection
+
+try:
+    import pyarrow.dataset as ds
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Scorecard categories in display order
+CATEGORIES = [
+    'Growth & One Chase',
+    'Customer Experience',
+    'Financial Health & Innovation',
+    'Culture & Employee',
+    'Controls'
+]
+
+# Progress-bar colour of each category's metric box
+CATEGORY_COLORS = {
+    'Growth & One Chase': '#0052CC',
+    'Customer Experience': '#00A3BF',
+    'Financial Health & Innovation': '#36B37E',
+    'Culture & Employee': '#FF8B00',
+    'Controls': '#998DD9'
+}
+
+# Grain of the partial sums kept by stream_partial_sums: the coarsest grain that still
+# answers the category boxes (Category/Scorecard_Period/Peer_Group) and the subcategory
+# tables (Category/Subcategory), so it is independent of the number of branches
+STREAM_GRAIN = ['Category', 'Subcategory', 'Scorecard_Period', 'Peer_Group']
+
+# Batches of partial sums collected before they are folded into one
+STREAM_FOLD_EVERY = 64
+
+# Long-format columns loaded as a frame in streaming mode: the selector columns and
+# the branch-level fields behind the headline tiles
+BRANCH_COLUMNS = ['Scorecard_Period', 'Division', 'Region', 'Market', 'Branch_Name', 'Branch_ID',
+                  'Overall_Weighted_Score', 'Performance_Tier']
+
+# Grain of the sums behind the category metric boxes
+CATEGORY_GRAIN = ['Category', 'Scorecard_Period', 'Peer_Group']
+
+# Selector name -> long-format column it filters
+FILTER_COLUMNS = {
+    'scorecard_period': 'Scorecard_Period',
+    'division': 'Division',
+    'region': 'Region',
+    'market': 'Market',
+    'branch': 'Branch_Name'
+}
+
+def filter_long_data(df, **filters):
+    """
+    Apply the selector filters to a long-format frame with one combined mask.
+    Each filter is a single value or a list of values (multi-select); values starting
+    with "All" (e.g. 'All', 'All Markets') and empty lists leave a column unfiltered.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    plan = []
+    for name, value in filters.items():
+        values = selected_values(value)
+        if values:
+            mask &= isin_mask(df[FILTER_COLUMNS[name]], values)
+            plan.append((FILTER_COLUMNS[name], values))
+    if mask.all():
+        return df
+    return tag_selection(df[mask], df, plan)
+
+
+def load_and_filter_data(path=LONG_DATA_PATH, **filters):
+    """
+    Load the long-format scorecard (via its columnar snapshot) and apply the selector filters
+    """
+    return filter_long_data(load_workbook_snapshot(path), **filters)
+
+
+def _branch_rows(df):
+    """
+    One row per (period, branch), since branch-level fields repeat on every subcategory row
+    """
+    return df.drop_duplicates(['Scorecard_Period', 'Branch_ID'])
+
+
+def calculate_main_metrics(filtered_df, reference_df=None):
+    """
+    Headline metrics for the current selection: average overall weighted score,
+    rank and PL 1/2 vs PL 5/6 split.
+    The rank is only defined for a single branch and is taken against
+    `reference_df` (normally the unfiltered data) for the same periods.
+    """
+    if filtered_df.empty:
+        return {'overall_score': 0.0, 'overall_rank': 'N/A', 'pl_distribution': 'N/A'}
+
+    branches = _branch_rows(filtered_df)
+    overall_score = branches['Overall_Weighted_Score'].mean()
+
+    tier_pct = branches['Performance_Tier'].value_counts(normalize=True) * 100
+    pl_12_pct = tier_pct.reindex(['PL1', 'PL2'], fill_value=0).sum()
+    pl_56_pct = tier_pct.reindex(['PL5', 'PL6'], fill_value=0).sum()
+
+    overall_rank = 'N/A'
+    branch_ids = branches['Branch_ID'].unique()
+    if reference_df is not None and len(branch_ids) == 1:
+        periods = branches['Scorecard_Period'].unique()
+        reference = _branch_rows(reference_df[reference_df['Scorecard_Period'].isin(periods)])
+        scores = reference.groupby('Branch_ID', observed=True)['Overall_Weighted_Score'].mean()
+        ranks = scores.rank(ascending=False, method='min')
+        if branch_ids[0] in ranks.index:
+            overall_rank = int(ranks[branch_ids[0]])
+
+    return {
+        'overall_score': overall_score,
+        'overall_rank': overall_rank,
+        'pl_distribution': f"{pl_12_pct:.1f}% / {pl_56_pct:.1f}%"
+    }
+
+
+def calculate_category_metrics(filtered_df):
+    """
+    Average Value per scorecard category, from a single groupby
+    """
+    means = filtered_df.groupby('Category', observed=True)['Value'].mean()
+    return means.reindex(CATEGORIES, fill_value=0.0).to_dict()
+
+
+def subcategory_summary(filtered_df):
+    """
+    Mean Value and Weighted_Score plus the Weight of every (Category, Subcategory),
+    computed in one groupby. Compute it once per selection and pass it to
+    get_subcategory_metrics for every category table.
+    """
+    aggregations = {'Value': 'mean'}
+    if 'Weight' in filtered_df.columns:
+        aggregations['Weight'] = 'first'
+    if 'Weighted_Score' in filtered_df.columns:
+        aggregations['Weighted_Score'] = 'mean'
+
+    # Means accumulate in float64, as category_sums and stream_partial_sums do
+    values = filtered_df[list(aggregations)].astype(
+        {col: 'float64' for col, how in aggregations.items() if how == 'mean'})
+    keys = [filtered_df['Category'], filtered_df['Subcategory']]
+    return values.groupby(keys, sort=False, observed=True).agg(aggregations)
+
+
+def get_subcategory_metrics(filtered_df, category, summary=None):
+    """
+    Formatted table rows for one category's subcategories, from a precomputed
+    subcategory_summary when one is given
+    """
+    if summary is None:
+        summary = subcategory_summary(filtered_df)
+    if category not in summary.index.get_level_values('Category'):
+        return []
+
+    rows = []
+    for subcategory, row in summary.loc[category].iterrows():
+        rows.append({
+            'Metric': subcategory,
+            'YTD Sep 24': f"{row['Value']:.1f}%",
+            'Metric Score': f"{row['Value']:.1f}%",
+            'Weight': f"{row['Weight']}%" if 'Weight' in row.index else 'N/A',
+            'Weighted Score': f"{row['Weighted_Score']:.2f}%" if 'Weighted_Score' in row.index else 'N/A'
+        })
+    return rows
+
+
+def _stream_filter(filters):
+    """
+    pyarrow filter expression for the selector filters, or None when nothing is selected
+    """
+    expression = None
+    for name, value in filters.items():
+        values = selected_values(value)
+        if not values:
+            continue
+        condition = ds.field(FILTER_COLUMNS[name]).isin(list(values))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _fold(partials, aggregations):
+    """
+    Combine partial sums from several batches, keeping first-seen group order
+    """
+    if len(partials) == 1:
+        return partials[0]
+    return pd.concat(partials).groupby(level=STREAM_GRAIN, sort=False, observed=True).agg(aggregations)
+
+
+def stream_partial_sums(source=LONG_DATASET_DIR, batch_size=65536, **filters):
+    """
+    Value/Weighted_Score sums and counts per STREAM_GRAIN, built by reading the
+    long-format Parquet data (a partitioned dataset or a single snapshot) one record
+    batch at a time. Each batch is reduced to the grain on its own and the reductions
+    are folded every STREAM_FOLD_EVERY batches, so only partial sums are held in memory.
+    """
+    if not HAS_PYARROW:
+        raise ImportError("Streaming the long-format data requires pyarrow")
+    dataset = ds.dataset(source, format='parquet', partitioning='hive')
+    names = set(dataset.schema.names)
+    columns = STREAM_GRAIN + [col for col in ['Value', 'Weight', 'Weighted_Score'] if col in names]
+
+    aggregations = {'Value': 'sum', 'value_count': 'sum'}
+    if 'Weighted_Score' in names:
+        aggregations.update({'Weighted_Score': 'sum', 'weighted_count': 'sum'})
+    if 'Weight' in names:
+        aggregations['Weight'] = 'first'
+
+    partials = []
+    for batch in dataset.to_batches(columns=columns, filter=_stream_filter(filters), batch_size=batch_size):
+        chunk = batch.to_pandas()
+        # Accumulate in float64 so long histories don't lose precision in the running sums
+        chunk['Value'] = chunk['Value'].astype('float64')
+        chunk['value_count'] = chunk['Value'].notna().astype('int64')
+        if 'Weighted_Score' in chunk.columns:
+            chunk['Weighted_Score'] = chunk['Weighted_Score'].astype('float64')
+            chunk['weighted_count'] = chunk['Weighted_Score'].notna().astype('int64')
+        partials.append(chunk.groupby(STREAM_GRAIN, sort=False, observed=True).agg(aggregations))
+        if len(partials) >= STREAM_FOLD_EVERY:
+            partials = [_fold(partials, aggregations)]
+
+    if not partials:
+        return pd.DataFrame(columns=['value_sum', 'value_count'], index=pd.MultiIndex.from_tuples([], names=STREAM_GRAIN))
+    return _fold(partials, aggregations).rename(
+        columns={'Value': 'value_sum', 'Weighted_Score': 'weighted_sum', 'Weight': 'weight'})
+
+
+def category_sums(filtered_df):
+    """
+    Value sum and count per CATEGORY_GRAIN from a single groupby, groups in order of
+    first appearance, in the same shape as stream_partial_sums output
+    """
+    values = filtered_df['Value'].astype('float64')
+    grouped = values.groupby([filtered_df[col] for col in CATEGORY_GRAIN], sort=False, observed=True, dropna=False)
+    return pd.DataFrame({'value_sum': grouped.sum(), 'value_count': grouped.count()})
+
+
+def _means(sums, by):
+    """
+    Mean Value per group of a slice of sums (NaN for groups without values)
+    """
+    totals = sums.groupby(by, sort=False, observed=True, dropna=False)[['value_sum', 'value_count']].sum()
+    return (totals['value_sum'] / totals['value_count']).to_dict()
+
+
+def category_metrics_from_sums(sums):
+    """
+    Category metric boxes (value, colour, vs last period, vs peer group, vs national)
+    from Value sums and counts at CATEGORY_GRAIN or finer. Every mean comes from one
+    aggregation over all categories; the current period's peer group of a category is
+    the one its first row belongs to.
+    """
+    empty = {"value": 0.0, "vs_last": "0.0%", "peer": "0.0%", "national": "0.0%"}
+    if sums.empty:
+        return {category: dict(empty, color=color) for category, color in CATEGORY_COLORS.items()}
+
+    by_level = sums.groupby(level=CATEGORY_GRAIN, sort=False, observed=True, dropna=False)[
+        ['value_sum', 'value_count']].sum().reset_index()
+    periods = build_period_index(by_level)
+
+    current = by_level[window_mask(periods, period_window(periods, 'current'))]
+    current_means = _means(current, 'Category')
+    prev_means = _means(by_level[window_mask(periods, period_window(periods, 'previous'))], 'Category')
+    peer_means = _means(by_level, ['Category', 'Peer_Group'])
+    national_means = _means(by_level, 'Category')
+    first_rows = current.drop_duplicates('Category')
+    peer_groups = dict(zip(first_rows['Category'].tolist(), first_rows['Peer_Group'].tolist()))
+
+    metrics = {}
+    for category, color in CATEGORY_COLORS.items():
+        if category not in national_means:
+            metrics[category] = dict(empty, color=color)
+            continue
+
+        current_value = current_means.get(category, 0.0)
+        prev_value = prev_means.get(category, current_value)
+        peer_avg = current_value
+        if category in peer_groups:
+            peer_avg = peer_means.get((category, peer_groups[category]), current_value)
+        national_avg = national_means[category]
+
+        metrics[category] = {
+            "value": current_value,
+            "color": color,
+            "vs_last": f"{current_value - prev_value:+.1f}%",
+            "peer": f"{current_value - peer_avg:+.1f}%",
+            "national": f"{current_value - national_avg:+.1f}%"
+        }
+    return metrics
+
+
+def calculate_filtered_metrics(filtered_df):
+    """
+    Category metric boxes for the current selection: one groupby to CATEGORY_GRAIN,
+    then every category's current, previous, peer and national means at once
+    """
+    return category_metrics_from_sums(category_sums(filtered_df))
+
+
+def subcategory_summary_from_partials(partials):
+    """
+    subcategory_summary computed from stream_partial_sums output: mean Value and
+    Weighted_Score plus the Weight of every (Category, Subcategory)
+    """
+    sums = partials.groupby(level=['Category', 'Subcategory'], sort=False, observed=True).agg(
+        {col: ('first' if col == 'weight' else 'sum') for col in partials.columns})
+    summary = pd.DataFrame({'Value': sums['value_sum'] / sums['value_count']}, index=sums.index)
+    if 'weight' in sums.columns:
+        summary['Weight'] = sums['weight']
+    if 'weighted_sum' in sums.columns:
+        summary['Weighted_Score'] = sums['weighted_sum'] / sums['weighted_count']
+    return summary
@@ -0,0 +1,161 @@
+# filter_engine.py
+
+import numpy as np
+import pandas as pd
+
+from config import HIERARCHY_COLUMNS
+from snapshot_store import tag_selection
+
+EMPTY_POSITIONS = np.empty(0, dtype=np.int64)
+
+def build_filter_index(df, columns=HIERARCHY_COLUMNS):
+    """
+    Per-column value -> sorted row positions, built once per dataset version
+    """
+    index = {}
+    for column in columns:
+        codes, uniques = pd.factorize(df[column])
+        # A stable sort keeps each value's positions in ascending row order
+        order = np.argsort(codes, kind='stable')
+        order = order[np.count_nonzero(codes < 0):]  # drop missing values (code -1)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        index[column] = dict(zip(uniques, np.split(order.astype(np.int64), np.cumsum(counts)[:-1])))
+    return index
+
+
+def selected_values(value):
+    """
+    The values a selector keeps, as a tuple; an empty tuple keeps everything.
+    Accepts a single value or a list of values (multi-select). None and
+    "All..." placeholders select everything.
+    """
+    if value is None:
+        return ()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(v for v in value if v is not None and not str(v).startswith('All'))
+    return () if str(value).startswith('All') else (value,)
+
+
+def code_mask(codes, categories, values):
+    """
+    Boolean mask of the integer codes whose category is in `values`, from one gather
+    through a per-category lookup table: the cost is the same however many values are
+    selected. Missing values (code -1) hit the table's trailing False slot.
+    """
+    wanted = categories.get_indexer(list(values))
+    table = np.zeros(len(categories) + 1, dtype=bool)
+    table[wanted[wanted >= 0]] = True
+    return table.take(codes)
+
+
+def isin_mask(series, values):
+    """
+    Boolean row mask of series.isin(values); categorical columns are matched on their codes
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return code_mask(series.cat.codes.to_numpy(), series.cat.categories, values)
+    return series.isin(list(values)).to_numpy()
+
+
+def compile_filter_plan(filters):
+    """
+    Hashable (column, values) pairs for the active selections
+    """
+    plan = []
+    for column, value in filters.items():
+        values = selected_values(value)
+        if values:
+            plan.append((column, values))
+    return tuple(plan)
+
+
+def _union_positions(positions_by_value, values):
+    parts = [positions_by_value[value] for value in values if value in positions_by_value]
+    if not parts:
+        return EMPTY_POSITIONS
+    return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+
+def select_rows(index, filters):
+    """
+    Row positions matching every column filter (one value or any of several),
+    intersected smallest list first. Returns None when nothing is filtered.
+    """
+    selections = [_union_positions(index[column], values) for column, values in compile_filter_plan(filters)]
+    if not selections:
+        return None
+
+    selections.sort(key=len)
+    positions = selections[0]
+    for other in selections[1:]:
+        if len(positions) == 0:
+            break
+        positions = np.intersect1d(positions, other, assume_unique=True)
+    return positions
+
+
+def apply_selection(df, positions):
+    """
+    The selected rows: the frame itself when unfiltered, otherwise a single take
+    """
+    return df if positions is None else df.take(positions)
+
+
+def branch_paths(frames, key='Branch', levels=HIERARCHY_COLUMNS):
+    """
+    One row per branch with its hierarchy path across aligned snapshots, as categorical
+    columns. A branch keeps the path of the first snapshot it appears in, so every
+    snapshot is filtered by the same branches.
+    """
+    parts = []
+    for frame in frames:
+        if key in frame.columns:
+            parts.append(frame[list(dict.fromkeys([key] + [col for col in levels if col in frame.columns]))])
+    if not parts:
+        return pd.DataFrame(columns=[key])
+    paths = pd.concat(parts, ignore_index=True).drop_duplicates(subset=[key], ignore_index=True)
+    return paths.astype('category')
+
+
+def match_branches(paths, plan, key='Branch'):
+    """
+    Branches whose path satisfies every (column, values) pair of a compiled plan
+    """
+    mask = np.ones(len(paths), dtype=bool)
+    for column, values in plan:
+        if column not in paths.columns:
+            return set()
+        mask &= isin_mask(paths[column], values)
+    return set(paths[key].to_numpy()[mask].tolist())
+
+
+def select_branches(branch_index, branches):
+    """
+    Sorted row positions of the given branches in one snapshot
+    """
+    return _union_positions(branch_index, branches)
+
+
+def filter_snapshots(frames, filters, key='Branch', branch_indexes=None, paths=None):
+    """
+    Apply one filter plan to any number of aligned snapshots (e.g. current and previous).
+    The plan is evaluated once against the branch paths, then each snapshot only looks
+    up the matching branches' rows. Prebuilt branch indexes and paths can be passed in.
+    """
+    plan = compile_filter_plan(filters)
+    if not plan:
+        return list(frames)
+
+    branches = match_branches(paths if paths is not None else branch_paths(frames, key), plan, key)
+    filtered = []
+    for i, frame in enumerate(frames):
+        if key not in frame.columns:
+            filtered.append(frame)
+            continue
+        if branch_indexes is not None:
+            branch_index = branch_indexes[i]
+        else:
+            branch_index = build_filter_index(frame, [key])[key]
+        selected = apply_selection(frame, select_branches(branch_index, branches))
+        filtered.append(tag_selection(selected, frame, plan))
+    return filtered
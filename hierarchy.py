@@ -0,0 +1,82 @@
+# hierarchy.py
+
+import re
+from itertools import chain
+
+from config import HIERARCHY_COLUMNS
+
+
+def _natural_key(value):
+    """
+    Sort key that orders "Branch2" before "Branch10"
+    """
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', str(value))]
+
+
+def _sorted_values(values):
+    return sorted({value for value in values if value == value}, key=_natural_key)
+
+
+def build_hierarchy_index(df, levels=HIERARCHY_COLUMNS):
+    """
+    Precompute the cascading selector options for one dataset version:
+    - options: every value of each level, sorted
+    - positions: level -> {value: position in options}, to merge sorted child lists
+    - children: (parent level, child level) -> {parent value: sorted child values},
+      for every parent above the child, so options can be narrowed by any ancestor
+    - ancestors: leaf value (branch) -> {level: value} for the levels above it
+    """
+    index = {'options': {}, 'positions': {}, 'children': {}, 'ancestors': {}}
+    if df.empty:
+        for i, column in enumerate(levels):
+            index['options'][column] = []
+            index['positions'][column] = {}
+            for parent in levels[:i]:
+                index['children'][(parent, column)] = {}
+        return index
+
+    # The hierarchy is tiny next to the metric rows, so work on its distinct combinations
+    paths = df[list(levels)].drop_duplicates()
+    path_rows = list(zip(*(paths[column].tolist() for column in levels)))
+
+    for i, column in enumerate(levels):
+        index['options'][column] = _sorted_values(row[i] for row in path_rows)
+        index['positions'][column] = {value: k for k, value in enumerate(index['options'][column])}
+        for j, parent in enumerate(levels[:i]):
+            grouped = {}
+            for row in path_rows:
+                grouped.setdefault(row[j], set()).add(row[i])
+            index['children'][(parent, column)] = {
+                parent_value: _sorted_values(children) for parent_value, children in grouped.items()
+            }
+
+    leaf = len(levels) - 1
+    for row in path_rows:
+        index['ancestors'].setdefault(row[leaf], dict(zip(levels[:leaf], row[:leaf])))
+    return index
+
+
+def child_options(index, column, parent_column=None, parent_value=None):
+    """
+    Options for a selector, optionally narrowed to one ancestor selection
+    (a single value, or a list of values whose children are combined). The children
+    of several values are already sorted runs, combined by their option positions
+    so the natural sort key is never recomputed here.
+    """
+    if parent_column is None:
+        return index['options'][column]
+    children = index['children'][(parent_column, column)]
+    if not isinstance(parent_value, (list, tuple, set, frozenset)):
+        return children.get(parent_value, [])
+    lists = [children[value] for value in dict.fromkeys(parent_value) if value in children]
+    if len(lists) <= 1:
+        return lists[0] if lists else []
+    # A child can sit under several selected parents when the data disagrees
+    return list(dict.fromkeys(sorted(chain(*lists), key=index['positions'][column].__getitem__)))
+
+
+def branch_ancestors(index, branch):
+    """
+    Division/Region/Market of a branch (first occurrence if the data disagrees)
+    """
+    return index['ancestors'].get(branch, {})
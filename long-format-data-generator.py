@@ -2,6 +2,9 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
+from partitioned_store import write_partitioned_dataset
+from schema import apply_long_schema
+
 def generate_long_format_data(num_branches=100, months_of_data=12):
     # Fixed category mappings
     category_subcategory_mapping = {
@@ -127,6 +130,9 @@ def generate_long_format_data(num_branches=100, months_of_data=12):
 
     # Save to Excel
     df.to_excel('scorecard_data_long.xlsx', index=False)
+
+    # Also write the Division/period partitioned dataset the dashboard reads
+    write_partitioned_dataset(apply_long_schema(df))
     print(f"Generated {len(df)} records in long format")
     return df
 
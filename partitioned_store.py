@@ -0,0 +1,90 @@
+# partitioned_store.py
+
+import hashlib
+import os
+import shutil
+import uuid
+from urllib.parse import unquote
+
+import pandas as pd
+
+from config import LONG_DATASET_DIR
+from filter_engine import selected_values
+from periods import add_period_codes
+from snapshot_store import tag_fingerprint
+
+# Directory levels of the dataset: <root>/Division=<d>/Scorecard_Period=<p>/*.parquet
+PARTITION_COLUMNS = ['Division', 'Scorecard_Period']
+
+
+def write_partitioned_dataset(df, root=LONG_DATASET_DIR):
+    """
+    Write long-format data as Parquet files partitioned by Division and Scorecard_Period.
+    Any existing dataset at `root` is replaced as a whole, so readers never see a mix
+    of old and new partitions.
+    """
+    staging = f"{root}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(staging, partition_cols=PARTITION_COLUMNS, index=False)
+
+    if os.path.exists(root):
+        retired = f"{root}.{uuid.uuid4().hex}.old"
+        os.replace(root, retired)
+        os.replace(staging, root)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.replace(staging, root)
+    return root
+
+
+def _partition_dirs(path, column):
+    """
+    (value, directory) for each "<column>=<value>" directory directly under `path`
+    """
+    entries = []
+    for name in sorted(os.listdir(path)):
+        key, _, value = name.partition('=')
+        if key == column and os.path.isdir(os.path.join(path, name)):
+            entries.append((unquote(value), os.path.join(path, name)))
+    return entries
+
+
+def list_partitions(root=LONG_DATASET_DIR):
+    """
+    (division, scorecard_period) pairs present on disk, read from directory names only
+    """
+    partitions = []
+    for division, division_dir in _partition_dirs(root, PARTITION_COLUMNS[0]):
+        for period, _ in _partition_dirs(division_dir, PARTITION_COLUMNS[1]):
+            partitions.append((division, period))
+    return partitions
+
+
+def dataset_version(root=LONG_DATASET_DIR):
+    """
+    Cheap version stamp for the dataset: a hash of every data file's path, mtime and size
+    """
+    hasher = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            hasher.update(f"{os.path.relpath(path, root)}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+    return hasher.hexdigest()
+
+
+def load_partitions(root=LONG_DATASET_DIR, division=None, scorecard_period=None, columns=None):
+    """
+    Read only the partitions matching the selected Division and Scorecard_Period.
+    Each may be one value or a list of values; None, an "All..." value or an empty
+    list reads every partition at that level.
+    """
+    version = dataset_version(root)
+    filters = []
+    for column, value in zip(PARTITION_COLUMNS, [division, scorecard_period]):
+        values = selected_values(value)
+        if values:
+            filters.append((column, 'in', list(values)))
+    # Datasets written before period codes existed get them on read
+    df = add_period_codes(pd.read_parquet(root, columns=columns, filters=filters or None))
+    return tag_fingerprint(df, version, [(column, tuple(values)) for column, _, values in filters])
@@ -0,0 +1,105 @@
+# periods.py
+
+import calendar
+
+import numpy as np
+import pandas as pd
+
+# Integer column holding each row's period as year * 12 + (month - 1)
+PERIOD_CODE_COLUMN = 'Period_Code'
+
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+
+
+def period_code(label):
+    """
+    Chronological integer code of a period label: "September 2024", "Sep 2024" or "2024-09"
+    """
+    text = str(label).strip()
+    parts = text.split()
+    if len(parts) == 2 and parts[0].lower() in _MONTHS and parts[1].isdigit():
+        return int(parts[1]) * 12 + _MONTHS[parts[0].lower()] - 1
+    year, _, month = text.partition('-')
+    if year.isdigit() and month.isdigit() and 1 <= int(month) <= 12:
+        return int(year) * 12 + int(month) - 1
+    raise ValueError(f"Unrecognised period {label!r}")
+
+
+def period_label(code):
+    """
+    "Month YYYY" label of a period code
+    """
+    year, month = divmod(int(code), 12)
+    return f"{calendar.month_name[month + 1]} {year}"
+
+
+def sort_periods(labels):
+    """
+    Period labels in chronological order
+    """
+    return sorted(labels, key=period_code)
+
+
+def period_codes(series):
+    """
+    Period code of every row of a Scorecard_Period column. Each distinct label is
+    parsed once; the rows only gather from those codes.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        table = np.array([period_code(label) for label in series.cat.categories] + [-1], dtype=np.int32)
+        return table[series.cat.codes.to_numpy()]
+    codes, uniques = pd.factorize(series)
+    table = np.array([period_code(label) for label in uniques] + [-1], dtype=np.int32)
+    return table[codes]
+
+
+def add_period_codes(df, column='Scorecard_Period'):
+    """
+    Store the period code of every row in PERIOD_CODE_COLUMN (no-op without `column`)
+    """
+    if column in df.columns and PERIOD_CODE_COLUMN not in df.columns:
+        df[PERIOD_CODE_COLUMN] = period_codes(df[column])
+    return df
+
+
+def build_period_index(df, column='Scorecard_Period'):
+    """
+    Chronological index of the periods in a frame:
+    - codes: sorted distinct period codes, so a window of periods is a slice
+    - labels: the label of each code
+    - ordinals: each row's position in `codes`
+    """
+    if PERIOD_CODE_COLUMN in df.columns:
+        row_codes = df[PERIOD_CODE_COLUMN].to_numpy()
+    else:
+        row_codes = period_codes(df[column])
+    codes, ordinals = np.unique(row_codes, return_inverse=True)
+    return {'codes': codes, 'labels': [period_label(code) for code in codes], 'ordinals': ordinals.ravel()}
+
+
+def period_window(index, window='current', n=3):
+    """
+    Slice of index['codes'] covering a window ending at the latest period:
+    'current', 'previous', 'ytd' (the latest period's year so far) or 'trailing' (last n)
+    """
+    end = len(index['codes'])
+    if window == 'current':
+        return slice(max(end - 1, 0), end)
+    if window == 'previous':
+        return slice(max(end - 2, 0), max(end - 1, 0))
+    if window == 'ytd':
+        if end == 0:
+            return slice(0, 0)
+        first_month = index['codes'][-1] // 12 * 12
+        return slice(int(np.searchsorted(index['codes'], first_month)), end)
+    if window == 'trailing':
+        return slice(max(end - n, 0), end)
+    raise ValueError(f"Unknown period window {window!r}")
+
+
+def window_mask(index, window):
+    """
+    Boolean row mask of the rows whose period falls in a period_window slice
+    """
+    return (index['ordinals'] >= window.start) & (index['ordinals'] < window.stop)
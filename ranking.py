@@ -0,0 +1,107 @@
+# ranking.py
+
+import numpy as np
+
+from scorecard_metrics import OVERALL_SCORE_COLUMN, PEER_GROUP_COLUMN
+
+
+def rank_within_groups(scores, groups):
+    """
+    Dense rank (1 = highest score) and percentile of every score within its group,
+    from two sorts. The percentile is the share of the group scoring at or below
+    the value, so the group leader is at 100. Missing scores get NaN and are not
+    counted in their group's size.
+    Returns (dense, percentile, group_size) as float64 arrays aligned with `scores`.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    groups = np.asarray(groups)
+    dense = np.full(len(scores), np.nan)
+    percentile = np.full(len(scores), np.nan)
+    group_size = np.full(len(scores), np.nan)
+
+    missing = np.isnan(scores)
+    if missing.all():
+        return dense, percentile, group_size
+
+    # Scores descending, then a stable sort by group keeps that order inside each group,
+    # so ties and group edges are neighbours (cheaper than a lexsort on both keys)
+    if missing.any():
+        valid = np.flatnonzero(~missing)
+        order = valid[np.argsort(-scores[valid])]
+    else:
+        order = np.argsort(-scores)
+    order = order[np.argsort(groups[order], kind='stable')]
+    sorted_scores, sorted_groups = scores[order], groups[order]
+
+    group_start = np.empty(len(order), dtype=bool)
+    group_start[0] = True
+    np.not_equal(sorted_groups[1:], sorted_groups[:-1], out=group_start[1:])
+    value_start = group_start.copy()
+    value_start[1:] |= sorted_scores[1:] != sorted_scores[:-1]
+
+    starts = np.flatnonzero(group_start)
+    sizes = np.diff(np.append(starts, len(order)))
+    size = np.repeat(sizes, sizes)
+    group_first = np.repeat(starts, sizes)
+    # Position of the first row tied with each row
+    value_first = np.maximum.accumulate(np.where(value_start, np.arange(len(order)), 0))
+    distinct = np.cumsum(value_start)
+
+    dense[order] = distinct - np.repeat(distinct[starts], sizes) + 1
+    # Rows ranked below the first tied row, plus the tied row itself, score at or below it
+    percentile[order] = (size - (value_first - group_first)) / size * 100
+    group_size[order] = size
+    return dense, percentile, group_size
+
+
+def scope_ranks(df, positions=None, score_column=OVERALL_SCORE_COLUMN, group_column=PEER_GROUP_COLUMN):
+    """
+    Ranks of the rows at `positions` (sorted row positions of a scope; None for every row)
+    within their peer group, computed only over that scope. Cache the result per scope;
+    row_rank looks single rows up in it.
+    """
+    if positions is None:
+        positions = np.arange(len(df), dtype=np.int64)
+    scores = df[score_column].to_numpy(dtype=np.float64, na_value=np.nan)[positions]
+    if group_column in df.columns:
+        groups = df[group_column].to_numpy()[positions]
+    else:
+        groups = np.zeros(len(positions), dtype=np.int8)
+    dense, percentile, group_size = rank_within_groups(scores, groups)
+    return {'positions': positions, 'groups': groups, 'dense': dense,
+            'percentile': percentile, 'group_size': group_size}
+
+
+def row_rank(ranks, position):
+    """
+    {'rank', 'of', 'percentile', 'group'} of one row position in scope_ranks output,
+    or None when the row is outside the scope or has no score
+    """
+    i = int(np.searchsorted(ranks['positions'], position))
+    if i == len(ranks['positions']) or ranks['positions'][i] != position or np.isnan(ranks['dense'][i]):
+        return None
+    group = ranks['groups'][i]
+    return {'rank': int(ranks['dense'][i]), 'of': int(ranks['group_size'][i]),
+            'percentile': float(ranks['percentile'][i]), 'group': group.item() if hasattr(group, 'item') else group}
+
+
+def ordinal(number):
+    """
+    English ordinal of a whole number: 1st, 2nd, 3rd, 4th, 11th, 12th, 13th, 21st, ...
+    """
+    if number % 100 in (11, 12, 13):
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+    return f"{number}{suffix}"
+
+
+def format_rank(rank, scope_size=1):
+    """
+    Overall Rank tile text: "3 of 12" with the peer group and percentile underneath.
+    A scope of several branches has no single rank.
+    """
+    if rank is None:
+        return "<small>Select one branch to rank</small>" if scope_size > 1 else "N/A"
+    return (f"{rank['rank']} of {rank['of']}"
+            f"<br><small>PG {rank['group']} · {ordinal(round(rank['percentile']))} percentile</small>")
@@ -0,0 +1,82 @@
+# result_cache.py
+
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from config import RESULT_CACHE_MAX_BYTES
+
+# Per-selection results shared by every session in the server process:
+# key -> (value, estimated bytes), least recently used first
+_entries = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+_lock = threading.Lock()
+
+
+def estimate_size(value):
+    """
+    Approximate bytes held by a cached value: frames and arrays by their buffers,
+    containers by their items
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def cached_result(key, compute, max_bytes=RESULT_CACHE_MAX_BYTES):
+    """
+    Return the cached value for `key`, computing and storing it on a miss.
+    Keys are (artifact, dataset fingerprint, division, region, market, branch,
+    show_actual, compare). Values are shared across sessions and must not be modified.
+    Least recently used entries are evicted once the cache holds more than `max_bytes`.
+    """
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return entry[0]
+        _stats['misses'] += 1
+
+    # Computed outside the lock so other sessions' lookups aren't held up
+    value = compute()
+    size = estimate_size(value)
+    if size > max_bytes:
+        return value
+
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _stats['bytes'] -= previous[1]
+        _entries[key] = (value, size)
+        _stats['bytes'] += size
+        while _stats['bytes'] > max_bytes:
+            _, (_, evicted_size) = _entries.popitem(last=False)
+            _stats['bytes'] -= evicted_size
+            _stats['evictions'] += 1
+    return value
+
+
+def result_cache_stats():
+    """
+    Hit, miss and eviction counters plus the current entry count and size
+    """
+    with _lock:
+        return dict(_stats, entries=len(_entries))
+
+
+def clear_result_cache():
+    with _lock:
+        _entries.clear()
+        _stats.update(hits=0, misses=0, evictions=0, bytes=0)
@@ -0,0 +1,123 @@
+# schema.py
+
+import pandas as pd
+
+from config import HIERARCHY_COLUMNS, HEADLINE_COLUMNS, METRICS_CONFIG, TABLE_CONFIGS
+from periods import add_period_codes
+
+# Bump when the declared dtypes change so existing snapshots are rebuilt
+SCHEMA_VERSION = 2
+
+# Low-cardinality hierarchy/label columns, stored as pandas categoricals
+CATEGORICAL_COLUMNS = ['Division', 'Region', 'Market', 'Branch', 'BranchManager', 'BranchType']
+
+# Columns that hold small whole numbers
+INTEGER_COLUMNS = {
+    'PG': 'int16',
+    'overall_rank': 'int32',
+    'Performance_Level': 'int8'
+}
+
+# Every other numeric column is a metric
+METRIC_DTYPE = 'float32'
+
+# Long-format scorecard: one row per (period, branch, subcategory), so every
+# label column repeats heavily
+LONG_CATEGORICAL_COLUMNS = [
+    'Month', 'Scorecard_Period', 'Division', 'Region', 'Market', 'Branch_ID', 'Branch_Name',
+    'Peer_Group', 'Country', 'Branch_Manager_SID', 'Branch_Manager_Name', 'Performance_Tier',
+    'Category', 'Subcategory', 'Drill_Down_Subcategory', 'Market_Chart_Indicator',
+    'Value_Type', 'Perspective', 'Data_Refresh_Date'
+]
+
+LONG_INTEGER_COLUMNS = {
+    'Year': 'int16',
+    'Tenure': 'int16',
+    'Peer_Group_Member_Count': 'int16',
+    'Market_Chart_Sort_Order': 'int16'
+}
+
+# Columns that appear twice in the scorecard header. pandas renames the second
+# occurrence to "<name>.1"; the app has always read the first occurrence.
+DUPLICATE_COLUMNS = ['growth_score', 'customer_exp_score', 'financial_health_score', 'culture_score']
+
+
+def resolve_duplicate_columns(df, keep='first'):
+    """
+    Collapse the duplicated header columns to a single column each.
+    keep='first' keeps the occurrence pandas leaves unrenamed, keep='last' the final one.
+    """
+    drop = []
+    for name in DUPLICATE_COLUMNS:
+        occurrences = [name] + [col for col in df.columns if col.startswith(f"{name}.") and col[len(name) + 1:].isdigit()]
+        if len(occurrences) < 2:
+            continue
+        winner = occurrences[0] if keep == 'first' else occurrences[-1]
+        if winner != name:
+            df[name] = df[winner]
+        drop.extend(col for col in occurrences if col != name)
+    return df.drop(columns=drop)
+
+
+def _cast(df, categorical_columns, integer_columns):
+    """
+    Cast categoricals, declared integers and float32 metrics in one astype
+    """
+    dtypes = {}
+    for col in df.columns:
+        if col in categorical_columns:
+            dtypes[col] = 'category'
+        elif col in integer_columns:
+            # Whole-number columns with gaps stay as metrics rather than failing the cast
+            dtypes[col] = integer_columns[col] if not df[col].isna().any() else METRIC_DTYPE
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            dtypes[col] = METRIC_DTYPE
+    return df.astype(dtypes)
+
+
+def apply_schema(df):
+    """
+    Cast a wide scorecard frame to the declared compact dtypes
+    """
+    return _cast(resolve_duplicate_columns(df), CATEGORICAL_COLUMNS, INTEGER_COLUMNS)
+
+
+def apply_long_schema(df):
+    """
+    Cast a long-format scorecard frame to the declared compact dtypes and add the
+    integer period codes (periods.PERIOD_CODE_COLUMN) that order Scorecard_Period
+    """
+    return add_period_codes(_cast(df, LONG_CATEGORICAL_COLUMNS, LONG_INTEGER_COLUMNS))
+
+
+def projected_columns():
+    """
+    Columns the scorecard app actually reads, derived from METRICS_CONFIG and TABLE_CONFIGS
+    """
+    columns = HIERARCHY_COLUMNS + HEADLINE_COLUMNS
+    for config in METRICS_CONFIG.values():
+        columns += [config['score_column'], *config['comparison_columns'].values()]
+    for table in TABLE_CONFIGS.values():
+        for metric in table['metrics']:
+            columns += [metric['ytd_col'], metric['score_col']]
+    return tuple(dict.fromkeys(columns))
+
+
+def read_scorecard_csv(path, columns=None, **kwargs):
+    """
+    Read a wide scorecard CSV straight into the declared schema.
+    When `columns` is given only those columns are parsed; missing ones are skipped.
+    """
+    if columns is not None:
+        wanted = set(columns)
+        kwargs.setdefault('usecols', lambda col: col in wanted)
+    # Parse hierarchy columns directly as categoricals to skip the object stage
+    kwargs.setdefault('dtype', {col: 'category' for col in CATEGORICAL_COLUMNS})
+    return apply_schema(pd.read_csv(path, **kwargs))
+
+
+def read_long_workbook(path, **kwargs):
+    """
+    Read the long-format scorecard workbook into the declared schema
+    """
+    return apply_long_schema(pd.read_excel(path, **kwargs))
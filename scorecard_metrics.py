@@ -0,0 +1,360 @@
+# scorecard_metrics.py
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from config import METRICS_CONFIG, TABLE_CONFIGS, HIERARCHY_COLUMNS, PL_BUCKETS
+from filter_engine import selected_values, code_mask
+
+# Column behind the "Overall Weighted Score" tile
+OVERALL_SCORE_COLUMN = 'gofirsttime-wt'
+
+# Column whose values form the peer groups; carried on the cube leaves so peer-group
+# groupings merge from them
+PEER_GROUP_COLUMN = 'PG'
+
+
+def summary_columns():
+    """
+    Numeric columns averaged for the headline tiles and the METRICS_CONFIG metric boxes
+    """
+    columns = [OVERALL_SCORE_COLUMN]
+    for config in METRICS_CONFIG.values():
+        columns += [config['score_column'], *config['comparison_columns'].values()]
+    return list(dict.fromkeys(columns))
+
+
+def metric_columns():
+    """
+    Summary columns plus every TABLE_CONFIGS YTD and score column: the columns
+    carried as mergeable moments
+    """
+    columns = summary_columns()
+    for table in TABLE_CONFIGS.values():
+        for metric in table['metrics']:
+            columns += [metric['ytd_col'], metric['score_col']]
+    return list(dict.fromkeys(columns))
+
+
+def frame_moments(df, columns):
+    """
+    Mergeable moments of a whole frame: count, sum, m2 (sum of squared deviations
+    from the mean, taken in a second pass), min and max per column
+    """
+    values = df[columns].astype('float64')
+    moments = {'rows': len(df)}
+    m2 = ((values - values.mean()) ** 2).sum()
+    for name, series in [('count', values.count()), ('sum', values.sum()), ('m2', m2),
+                         ('min', values.min()), ('max', values.max())]:
+        moments.update({f'{name}:{col}': value for col, value in series.items()})
+    return moments
+
+
+def column_means(frames, columns=None):
+    """
+    Mean of every summary column for each frame (e.g. current and previous), one
+    columnar reduction per frame accumulated in float64. A column a frame lacks is
+    left out of its dict; an empty frame gives NaN means.
+    """
+    columns = summary_columns() if columns is None else columns
+    means = []
+    for df in frames:
+        present = [col for col in columns if col in df.columns]
+        block = df[present].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(block)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where(valid, block, 0.0).sum(axis=0) / valid.sum(axis=0)
+        means.append(dict(zip(present, values.tolist())))
+    return means
+
+
+def leaf_moments(df, levels=HIERARCHY_COLUMNS):
+    """
+    One row of mergeable moments per leaf (Division, Region, Market, Branch, plus the
+    peer group when `levels` includes it): rows, first row position, count/sum/m2/min/max
+    of every metric column and the Performance_Level histogram (pl:<level>), as a
+    single float64 block
+    """
+    columns = [col for col in metric_columns() if col in df.columns]
+    keys = [df[level] for level in levels]
+    values = df[columns].astype('float64')
+
+    def grouped(frame):
+        return frame.groupby(keys, observed=True, dropna=False, sort=False)
+
+    parts = [
+        grouped(values).size().rename('rows'),
+        grouped(pd.Series(np.arange(len(df)), index=df.index)).min().rename('first'),
+        grouped(values).count().add_prefix('count:'),
+        grouped(values).sum().add_prefix('sum:'),
+        # Per-leaf squared deviations (pandas' groupby var is a stable single-pass update)
+        (grouped(values).var(ddof=0) * grouped(values).count()).fillna(0.0).add_prefix('m2:'),
+        grouped(values).min().add_prefix('min:'),
+        grouped(values).max().add_prefix('max:')
+    ]
+    if 'Performance_Level' in df.columns:
+        # Integer levels as in pl_histogram: a column with gaps is stored as float
+        levels = df['Performance_Level']
+        present = levels.notna().to_numpy()
+        histogram = (levels[present].astype(np.int64)
+                     .groupby([key[present] for key in keys], observed=True, dropna=False, sort=False)
+                     .value_counts().unstack(fill_value=0))
+        parts.append(histogram.reindex(parts[0].index, fill_value=0).add_prefix('pl:'))
+    leaves = pd.concat(parts, axis=1)
+    # One consolidated block keeps the per-lookup reductions to a single array each
+    return pd.DataFrame(leaves.to_numpy(dtype=np.float64), index=leaves.index, columns=leaves.columns)
+
+
+def merge_leaves(leaves):
+    """
+    Merge leaf moments into the moments of their union (a dict): counts and sums add,
+    min/max/first take the extreme, and m2 uses the pairwise (Chan et al.) update
+    m2 = sum(m2_i) + sum(n_i * (mean_i - mean)^2), which avoids the cancellation of
+    a sum-of-squares formula
+    """
+    # One row per moment column: reducing along rows of this (transposed, contiguous)
+    # view is several times faster than reducing the leaves axis of the frame's array
+    block = leaves.to_numpy(dtype=np.float64).T
+    merged = block.sum(axis=1)
+    columns = list(leaves.columns)
+    minimum = np.array([col == 'first' or col.startswith('min:') for col in columns])
+    maximum = np.array([col.startswith('max:') for col in columns])
+    if block.shape[1]:
+        # A leaf without values of a column has NaN extremes, which must not win
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            merged[minimum] = np.nanmin(block[minimum], axis=1)
+            merged[maximum] = np.nanmax(block[maximum], axis=1)
+    else:
+        merged[minimum | maximum] = np.nan
+
+    m2 = [i for i, col in enumerate(columns) if col.startswith('m2:')]
+    if m2 and block.shape[1]:
+        counts = block[[columns.index('count:' + columns[i][3:]) for i in m2]]
+        sums = block[[columns.index('sum:' + columns[i][3:]) for i in m2]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums.sum(axis=1) / counts.sum(axis=1)
+            leaf_means = np.where(counts > 0, sums / counts, mean[:, None])
+        merged[m2] += (counts * (leaf_means - mean[:, None]) ** 2).sum(axis=1)
+    return dict(zip(columns, merged.tolist()))
+
+
+def rollup_moments(moments, by):
+    """
+    Merge moment rows per group of the index levels `by`: the vectorised form of
+    merge_leaves, one row of merged moments per group with the same columns
+    """
+    columns = list(moments.columns)
+    grouped = moments.groupby(level=by, observed=True, dropna=False, sort=False)
+    minimum = [col for col in columns if col == 'first' or col.startswith('min:')]
+    maximum = [col for col in columns if col.startswith('max:')]
+    merged = grouped.sum()
+    merged[minimum] = grouped[minimum].min()
+    merged[maximum] = grouped[maximum].max()
+
+    m2 = [col for col in columns if col.startswith('m2:')]
+    if m2:
+        # Pairwise update as in merge_leaves, each row against its group's mean
+        group = grouped.ngroup().to_numpy()
+        counts = moments[['count:' + col[3:] for col in m2]].to_numpy()
+        sums = moments[['sum:' + col[3:] for col in m2]].to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (merged[['sum:' + col[3:] for col in m2]].to_numpy()
+                     / merged[['count:' + col[3:] for col in m2]].to_numpy())[group]
+            row_means = np.where(counts > 0, sums / counts, means)
+        spread = np.nan_to_num(counts * (row_means - means) ** 2)
+        merged[m2] += pd.DataFrame(spread).groupby(group).sum().to_numpy()
+
+    if not isinstance(merged.index, pd.MultiIndex):
+        merged.index = pd.MultiIndex.from_arrays([merged.index], names=by)
+    return merged[columns]
+
+
+def select_leaves(leaves, selections):
+    """
+    Leaves matching {level: value or list of values}, where a level is any leaf index
+    level including the peer group; None or "All..." leaves a level open.
+    Levels are matched on the index codes through filter_engine.code_mask, the same
+    membership step as the long app's filters. Merging the result gives the moments
+    of any ad-hoc grouping without touching rows.
+    """
+    mask = None
+    for level, value in selections.items():
+        values = selected_values(value)
+        if not values:
+            continue
+        i = leaves.index.names.index(level)
+        level_mask = code_mask(leaves.index.codes[i], leaves.index.levels[i], values)
+        mask = level_mask if mask is None else mask & level_mask
+    return leaves if mask is None else leaves[mask]
+
+
+def summary_from_moments(moments, columns, pl_counts=None, first_rank='N/A'):
+    """
+    Scope summary from merged moments: row count, means, sample standard deviations,
+    minima and maxima per column, Performance_Level counts and the first row's rank
+    """
+    summary = {'row_count': int(moments['rows']), 'means': {}, 'stds': {}, 'mins': {}, 'maxs': {},
+               'pl_counts': pl_counts or {}, 'first_rank': first_rank}
+    for col in columns:
+        count, total = moments[f'count:{col}'], moments[f'sum:{col}']
+        mean = total / count if count else float('nan')
+        variance = moments[f'm2:{col}'] / (count - 1) if count > 1 else float('nan')
+        summary['means'][col] = mean
+        summary['stds'][col] = float(np.sqrt(variance)) if variance == variance else variance
+        summary['mins'][col] = moments[f'min:{col}']
+        summary['maxs'][col] = moments[f'max:{col}']
+    return summary
+
+
+def summarize_frame(df):
+    """
+    Everything the headline tiles and metric boxes need for one scope:
+    row count, column moments, Performance_Level counts and the first row's overall_rank
+    """
+    columns = [col for col in metric_columns() if col in df.columns]
+    return summary_from_moments(
+        frame_moments(df, columns),
+        columns,
+        pl_counts=pl_histogram(df),
+        first_rank=df['overall_rank'].iloc[0] if not df.empty and 'overall_rank' in df.columns else 'N/A'
+    )
+
+
+def pl_histogram(df):
+    """
+    Performance_Level -> branch count for one frame, from a single bincount over the
+    integer levels. Every PL bucket split is derived from this without rescanning.
+    """
+    if 'Performance_Level' not in df.columns:
+        return {}
+    levels = df['Performance_Level'].dropna().to_numpy()
+    if len(levels) == 0:
+        return {}
+    levels = levels.astype(np.int64)
+    low = min(int(levels.min()), 0)
+    counts = np.bincount(levels - low)
+    return {level + low: int(count) for level, count in enumerate(counts.tolist()) if count}
+
+
+def pl_bucket_shares(pl_counts, total, buckets=PL_BUCKETS):
+    """
+    Percentage of `total` branches in each PL bucket (label -> levels), from a histogram
+    """
+    if total == 0:
+        return {label: 0 for label in buckets}
+    return {label: sum(pl_counts.get(level, 0) for level in levels) / total * 100
+            for label, levels in buckets.items()}
+
+
+def pl_bucket_title(buckets=PL_BUCKETS):
+    """
+    Title of the PL headline tile, e.g. "% of Branches in PL 1/2 vs. PL 5/6"
+    """
+    return "% of Branches in " + " vs. ".join(buckets)
+
+
+def format_pl_distribution(summary, buckets=PL_BUCKETS):
+    """
+    "% of branches in each PL bucket" for a scope summary, e.g. "12.5% / 8.3%"
+    """
+    total_branches = summary['row_count']
+    if total_branches == 0:
+        return "N/A"
+
+    shares = pl_bucket_shares(summary['pl_counts'], total_branches, buckets)
+    return " / ".join(f"{share:.1f}%" for share in shares.values())
+
+
+def _cell_summary(cube, moments):
+    pl_counts = {int(col[3:]): int(moments[col]) for col in cube['pl_columns'] if moments[col]}
+    first_rank = cube['ranks'][int(moments['first'])] if cube['ranks'] is not None else 'N/A'
+    return summary_from_moments(moments, cube['columns'], pl_counts, first_rank)
+
+
+def build_metric_cube(df, levels=HIERARCHY_COLUMNS):
+    """
+    Moments of one dataset version: one leaf per (Division, Region, Market, Branch),
+    keyed by peer group too when the frame has one, and the nested rollups of the
+    level prefixes (grand total, Division, Division/Region, Division/Region/Market),
+    each built from the next finer one so the whole cube costs O(leaves).
+    rollups[d] is indexed by the first d levels; group_rollup merges the leaves per
+    peer group.
+    """
+    levels = list(levels)
+    cube = {'levels': levels, 'empty': summarize_frame(df.iloc[:0]), 'leaves': None}
+    if df.empty:
+        return cube
+
+    group_column = PEER_GROUP_COLUMN if PEER_GROUP_COLUMN in df.columns else None
+    leaves = leaf_moments(df, levels + ([group_column] if group_column else []))
+    rollups = {}
+    finer = leaves
+    for depth in range(len(levels) - 1, 0, -1):
+        rollups[depth] = finer = rollup_moments(finer, levels[:depth])
+    rollups[0] = pd.DataFrame([merge_leaves(finer)], columns=leaves.columns)
+    cube.update({
+        'leaves': leaves,
+        'rollups': rollups,
+        'group_column': group_column,
+        'group_rollup': rollup_moments(leaves, [group_column]) if group_column else None,
+        'columns': [col for col in metric_columns() if col in df.columns],
+        'pl_columns': [col for col in leaves.columns if col.startswith('pl:')],
+        'ranks': df['overall_rank'].to_numpy() if 'overall_rank' in df.columns else None
+    })
+    return cube
+
+
+def _cube_rows(cube, chosen):
+    """
+    The fewest cube rows whose union is the selection `chosen` ({level: values}, open
+    levels left out): the rollup at the depth of the deepest selected level, or the
+    leaves when a branch or a peer group within the hierarchy is selected. One value per level of a level
+    prefix is a single index lookup.
+    """
+    levels = cube['levels']
+    depth = max((levels.index(level) + 1 for level in chosen if level in levels), default=0)
+    if cube['group_column'] in chosen:
+        if depth == 0:
+            return select_leaves(cube['group_rollup'], chosen)
+        return select_leaves(cube['leaves'], chosen)
+    if depth == len(levels):
+        return select_leaves(cube['leaves'], chosen)
+    rollup = cube['rollups'][depth]
+    if depth == 0:
+        return rollup
+    if len(chosen) == depth and all(len(values) == 1 for values in chosen.values()):
+        try:
+            position = rollup.index.get_loc(tuple(chosen[level][0] for level in levels[:depth]))
+        except KeyError:
+            return rollup.iloc[:0]
+        return rollup.iloc[[position]]
+    return select_leaves(rollup, chosen)
+
+
+def cube_summary(cube, selections, peer_groups=None):
+    """
+    Scope summary for one selection, given one selector value (or list of values) per
+    cube level and optionally the peer groups to keep. None, "All..." or an empty list
+    select every value of a level. The matching rollup rows (or leaves) are merged
+    into one set of moments.
+    """
+    if cube['leaves'] is None:
+        return cube['empty']
+    chosen = {level: values for level, values in
+              ((level, selected_values(value)) for level, value in zip(cube['levels'], selections)) if values}
+    if selected_values(peer_groups):
+        if cube['group_column'] is None:
+            return cube['empty']
+        chosen[cube['group_column']] = selected_values(peer_groups)
+
+    rows = _cube_rows(cube, chosen)
+    if rows.empty:
+        return cube['empty']
+    if len(rows) == 1:
+        moments = dict(zip(rows.columns, rows.to_numpy(dtype=np.float64)[0].tolist()))
+    else:
+        moments = merge_leaves(rows)
+    return _cell_summary(cube, moments)
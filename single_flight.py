@@ -0,0 +1,92 @@
+# single_flight.py
+
+import os
+import threading
+import time
+
+from snapshot_store import file_digest
+
+# name -> (file stat, digest, value) of the version currently served
+_current = {}
+# (name, file stat) -> in-progress reload that other callers can wait on
+_flights = {}
+# name -> reload counters exposed by reload_stats
+_stats = {}
+_lock = threading.Lock()
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _stats_for(name):
+    return _stats.setdefault(name, {
+        'version': None, 'reloads': 0, 'failures': 0, 'last_reload_seconds': None,
+        'waiting': 0, 'max_waiting': 0, 'stale_served': 0
+    })
+
+
+def load_current(name, path, loader, serve_stale=True):
+    """
+    Return (digest, value) for the current contents of `path`, where `loader(path, digest)`
+    builds the value. When the file changes, the first caller reloads it while concurrent
+    callers either keep the previous version (serve_stale, when there is one) or wait
+    for that single reload instead of starting their own.
+    """
+    stat = _file_stat(path)
+    with _lock:
+        current = _current.get(name)
+        if current is not None and current[0] == stat:
+            return current[1], current[2]
+
+        stats = _stats_for(name)
+        flight = _flights.get((name, stat))
+        leader = flight is None
+        if leader:
+            flight = {'done': threading.Event(), 'result': None, 'error': None}
+            _flights[(name, stat)] = flight
+        elif serve_stale and current is not None:
+            stats['stale_served'] += 1
+            return current[1], current[2]
+        else:
+            stats['waiting'] += 1
+            stats['max_waiting'] = max(stats['max_waiting'], stats['waiting'])
+
+    if not leader:
+        flight['done'].wait()
+        with _lock:
+            stats['waiting'] -= 1
+        if flight['error'] is not None:
+            raise flight['error']
+        return flight['result']
+
+    started = time.perf_counter()
+    try:
+        digest = file_digest(path)
+        result = (digest, loader(path, digest))
+    except Exception as e:
+        with _lock:
+            stats['failures'] += 1
+            del _flights[(name, stat)]
+        flight['error'] = e
+        flight['done'].set()
+        raise
+
+    with _lock:
+        _current[name] = (stat, result[0], result[1])
+        del _flights[(name, stat)]
+        stats.update(version=result[0][:16], reloads=stats['reloads'] + 1,
+                     last_reload_seconds=time.perf_counter() - started)
+    flight['result'] = result
+    flight['done'].set()
+    return result
+
+
+def reload_stats():
+    """
+    Per-name reload counters: served version, reload count and last duration,
+    callers waiting right now (and the most ever), and stale versions served
+    """
+    with _lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
@@ -0,0 +1,129 @@
+# snapshot_history.py
+
+import argparse
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+from config import HISTORY_DIR
+from schema import read_scorecard_csv
+from snapshot_store import file_digest, tag_fingerprint
+
+try:
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+INDEX_FILE = 'index.json'
+
+# Periods are 'YYYY-MM' so that sorting the labels is chronological
+PERIOD_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+# history_dir -> (index mtime, index), so the index is only re-read after it changes
+_index_cache = {}
+
+
+def _index_path(history_dir):
+    return os.path.join(history_dir, INDEX_FILE)
+
+
+def load_index(history_dir=HISTORY_DIR):
+    """
+    Period -> version entry (file, digest, source, rows, recorded_at) for every recorded period
+    """
+    path = _index_path(history_dir)
+    if not os.path.exists(path):
+        return {}
+    mtime = os.stat(path).st_mtime_ns
+    cached = _index_cache.get(history_dir)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        index = json.load(f)
+    _index_cache[history_dir] = (mtime, index)
+    return index
+
+
+def _write_index(index, history_dir):
+    path = _index_path(history_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def record_period(path, period, history_dir=HISTORY_DIR):
+    """
+    Store a scorecard CSV as the immutable, compressed version for `period` ('YYYY-MM').
+    Recording the same contents again is a no-op; different contents for an existing
+    period are rejected.
+    """
+    if not PERIOD_PATTERN.match(period):
+        raise ValueError(f"Period must look like YYYY-MM, got {period!r}")
+
+    digest = file_digest(path)
+    index = dict(load_index(history_dir))
+    entry = index.get(period)
+    if entry is not None:
+        if entry['digest'] == digest:
+            return entry
+        raise ValueError(f"Period {period} is already recorded from different data")
+
+    os.makedirs(history_dir, exist_ok=True)
+    df = read_scorecard_csv(path)
+    file_name = f"{period}-{digest[:16]}.parquet"
+    target = os.path.join(history_dir, file_name)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, index=False, compression='zstd')
+    os.replace(tmp_path, target)
+
+    entry = {
+        'file': file_name,
+        'digest': digest,
+        'source': os.path.basename(path),
+        'rows': len(df),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    index[period] = entry
+    _write_index(index, history_dir)
+    return entry
+
+
+def list_periods(history_dir=HISTORY_DIR):
+    """
+    Recorded periods, oldest first
+    """
+    return sorted(load_index(history_dir))
+
+
+def load_period(period, columns=None, history_dir=HISTORY_DIR):
+    """
+    Load the recorded version of one period, optionally projected to `columns`
+    """
+    entry = load_index(history_dir)[period]
+    path = os.path.join(history_dir, entry['file'])
+    if columns is not None:
+        names = set(pq.read_schema(path).names)
+        columns = [col for col in columns if col in names]
+    return tag_fingerprint(pd.read_parquet(path, columns=columns), entry['digest'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the scorecard snapshot history")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record = subparsers.add_parser('record', help="Record a scorecard CSV as a period")
+    record.add_argument('path')
+    record.add_argument('period', help="YYYY-MM")
+    subparsers.add_parser('list', help="List recorded periods")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        entry = record_period(args.path, args.period)
+        print(f"{args.period}: {entry['rows']} rows from {entry['source']} ({entry['digest'][:16]})")
+    else:
+        for period, entry in sorted(load_index().items()):
+            print(f"{period}\t{entry['rows']} rows\t{entry['source']}\t{entry['recorded_at']}")
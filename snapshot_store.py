@@ -0,0 +1,247 @@
+# snapshot_store.py
+
+import hashlib
+import os
+import re
+import threading
+import weakref
+
+import pandas as pd
+
+from config import SNAPSHOT_DIR
+from schema import SCHEMA_VERSION, read_long_workbook, read_scorecard_csv
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Snapshot formats: Parquet is compact on disk, Arrow IPC can be memory-mapped
+SNAPSHOT_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+# (path, mtime, size) -> sha256 digest, so an unchanged file is never re-hashed
+_digest_cache = {}
+# id -> frame for the frames tagged by a loader or tag_selection. pandas copies attrs
+# onto derived frames (assign, sort_values, fillna, ...), so a tag is only trusted on
+# the very frame it was attached to.
+_tagged = weakref.WeakValueDictionary()
+# (snapshot dir, stem, extension) -> (previous snapshot, latest snapshot) ingested by this process
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def file_digest(path):
+    """
+    Return the sha256 content hash of a file, reusing the last result while
+    the file's mtime and size are unchanged
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _digest_cache.get(key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        _digest_cache[key] = digest
+    return digest
+
+
+def snapshot_path(path, digest, snapshot_dir=SNAPSHOT_DIR, fmt='parquet'):
+    """
+    Location of the columnar snapshot for a given source file and content hash
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(snapshot_dir, f"{stem}-{digest[:16]}-s{SCHEMA_VERSION}.{SNAPSHOT_EXTENSIONS[fmt]}")
+
+
+def _prune_snapshots(path, target, snapshot_dir, fmt):
+    """
+    Delete the other snapshots of `path` in this format (older contents or schema
+    versions), except the one `target` just replaced: sessions may still be served
+    it while the new version loads, so it goes at the next ingest
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    key = (snapshot_dir, stem, fmt)
+    with _versions_lock:
+        previous, latest = _versions.get(key, (None, None))
+        if target == latest:
+            return
+        previous, latest = latest, target
+        _versions[key] = (previous, latest)
+
+    version = re.compile(re.escape(stem) + r"-[0-9a-f]{16}-s\d+\." + re.escape(SNAPSHOT_EXTENSIONS[fmt]))
+    keep = {os.path.basename(name) for name in (previous, latest) if name}
+    for name in os.listdir(snapshot_dir):
+        if version.fullmatch(name) and name not in keep:
+            try:
+                os.remove(os.path.join(snapshot_dir, name))
+            except FileNotFoundError:
+                pass  # Removed by another process
+
+
+def _ingest(path, reader, snapshot_dir, fmt):
+    """
+    Write the snapshot for the current contents of `path` unless it already exists,
+    then prune the superseded snapshots of the same file
+    """
+    target = snapshot_path(path, file_digest(path), snapshot_dir, fmt)
+    if os.path.exists(target):
+        _prune_snapshots(path, target, snapshot_dir, fmt)
+        return target
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    df = reader(path)
+
+    # Write to a temp file first so concurrent readers never see a partial snapshot
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    if fmt == 'arrow':
+        # Uncompressed so the file can be memory-mapped without decoding
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+    else:
+        df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, target)
+    _prune_snapshots(path, target, snapshot_dir, fmt)
+    return target
+
+
+def ingest_csv(path, snapshot_dir=SNAPSHOT_DIR, fmt='parquet'):
+    """
+    Convert a scorecard CSV into a typed columnar snapshot keyed by its content hash.
+    Returns the snapshot path; the CSV is only parsed when no snapshot exists
+    for the current contents.
+    """
+    return _ingest(path, read_scorecard_csv, snapshot_dir, fmt)
+
+
+def ingest_workbook(path, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Convert the long-format Excel workbook into a typed Parquet snapshot keyed by
+    its content hash, so the slow Excel parse happens once per workbook version
+    rather than on every cold start.
+    """
+    return _ingest(path, read_long_workbook, snapshot_dir, 'parquet')
+
+
+def frame_signature(df):
+    """
+    Cheap row/column signature of a frame: row count plus a hash of its column names and dtypes
+    """
+    layout = repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()])
+    return f"{len(df)}x{len(df.columns)}-{hashlib.sha256(layout.encode()).hexdigest()[:12]}"
+
+
+def tag_fingerprint(df, digest, selection=()):
+    """
+    Attach a content fingerprint to a loaded frame (in df.attrs): the digest of the
+    file it came from, the selection applied since, and its row/column signature
+    """
+    df.attrs['fingerprint'] = {'digest': digest, 'selection': tuple(selection), 'signature': frame_signature(df)}
+    _tagged[id(df)] = df
+    return df
+
+
+def restore_fingerprint(df):
+    """
+    Trust the tag of a frame handed out by st.cache_data: the cache returns copies of
+    the frame it stored, carrying that frame's tag in attrs
+    """
+    tag = df.attrs.get('fingerprint')
+    if tag and tag['signature'] == frame_signature(df):
+        _tagged[id(df)] = df
+    return df
+
+
+def _trusted_tag(df):
+    """
+    The fingerprint tag of `df` if it was attached to this frame and still matches it
+    """
+    tag = df.attrs.get('fingerprint')
+    if tag and _tagged.get(id(df)) is df and tag['signature'] == frame_signature(df):
+        return tag
+    return None
+
+
+def tag_selection(df, source, selection):
+    """
+    Fingerprint a frame filtered from `source` by `selection` (filter_engine plan pairs),
+    carrying over the source's file digest
+    """
+    tag = _trusted_tag(source)
+    if df is source or tag is None:
+        return df
+    return tag_fingerprint(df, tag['digest'], tag['selection'] + tuple(selection))
+
+
+def frame_fingerprint(df):
+    """
+    Fingerprint of a frame for cache keys. Uses the tag set at load time when it belongs
+    to this frame, so it costs no more than reading the dtypes; frames derived from a
+    tagged one (which inherit its attrs), untagged or reshaped frames fall back to
+    hashing their contents.
+    """
+    tag = _trusted_tag(df)
+    if tag is not None:
+        return f"{tag['digest'][:16]}:{tag['selection']!r}:{tag['signature']}"
+    # Digest of the row hashes in order: a reordered frame is a different frame to row positions
+    rows = pd.util.hash_pandas_object(df).to_numpy()
+    return f"content:{hashlib.sha256(rows.tobytes()).hexdigest()[:16]}:{frame_signature(df)}"
+
+
+# hash_funcs for st.cache_data / st.cache_resource functions that take frames
+FRAME_HASH_FUNCS = {pd.DataFrame: frame_fingerprint}
+
+
+def _present(columns, available):
+    """
+    Keep the requested columns that exist in a snapshot, in request order
+    """
+    available = set(available)
+    return [col for col in columns if col in available]
+
+
+def load_snapshot(path, snapshot_dir=SNAPSHOT_DIR, columns=None):
+    """
+    Load a scorecard CSV through its columnar snapshot.
+    `columns` projects the read to just those columns.
+    Falls back to parsing the CSV when pyarrow is not installed.
+    """
+    if not HAS_PYARROW:
+        return tag_fingerprint(read_scorecard_csv(path, columns=columns), file_digest(path))
+    target = ingest_csv(path, snapshot_dir)
+    if columns is not None:
+        columns = _present(columns, pq.read_schema(target).names)
+    return tag_fingerprint(pd.read_parquet(target, columns=columns), file_digest(path))
+
+
+def open_shared_snapshot(path, snapshot_dir=SNAPSHOT_DIR, columns=None):
+    """
+    Memory-map the Arrow IPC snapshot of a scorecard CSV.
+    Numeric columns of the returned frame are read-only views into the mapped
+    file, so the OS page cache holds the data once however many sessions use it.
+    Columns left out of `columns` are never paged in.
+    """
+    if not HAS_PYARROW:
+        return tag_fingerprint(read_scorecard_csv(path, columns=columns), file_digest(path))
+    source = pa.memory_map(ingest_csv(path, snapshot_dir, fmt='arrow'), 'r')
+    table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(_present(columns, table.column_names))
+    return tag_fingerprint(table.to_pandas(split_blocks=True), file_digest(path))
+
+
+def load_workbook_snapshot(path, snapshot_dir=SNAPSHOT_DIR, columns=None):
+    """
+    Load the long-format workbook through its columnar snapshot.
+    Falls back to parsing the workbook when pyarrow is not installed.
+    """
+    if not HAS_PYARROW:
+        return tag_fingerprint(read_long_workbook(path, usecols=columns), file_digest(path))
+    target = ingest_workbook(path, snapshot_dir)
+    if columns is not None:
+        columns = _present(columns, pq.read_schema(target).names)
+    return tag_fingerprint(pd.read_parquet(target, columns=columns), file_digest(path))
@@ -0,0 +1,211 @@
+# sql_backend.py
+
+import re
+import sqlite3
+import threading
+
+import pandas as pd
+
+from config import SQL_DB_PATH
+from scorecard_metrics import metric_columns, summary_from_moments
+from filter_engine import compile_filter_plan
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+# One connection per database file, shared by every session; queries are serialised
+_connections = {}
+_columns = {}
+# (database, name) -> (previous table, latest table) ingested by this process
+_versions = {}
+_lock = threading.Lock()
+
+
+def database_path(path=SQL_DB_PATH):
+    """
+    Database file for the engine in use, so DuckDB and SQLite files never collide
+    """
+    return f"{path}.duckdb" if HAS_DUCKDB else f"{path}.sqlite"
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _connection(path):
+    conn = _connections.get(path)
+    if conn is None:
+        if HAS_DUCKDB:
+            conn = duckdb.connect(database_path(path))
+        else:
+            conn = sqlite3.connect(database_path(path), check_same_thread=False)
+        _connections[path] = conn
+    return conn
+
+
+def _query(sql, params=(), path=SQL_DB_PATH):
+    with _lock:
+        return _connection(path).execute(sql, list(params)).fetchall()
+
+
+def _table_names(conn):
+    if HAS_DUCKDB:
+        sql = "SELECT table_name FROM information_schema.tables"
+    else:
+        sql = "SELECT name FROM sqlite_master WHERE type = 'table'"
+    return [row[0] for row in conn.execute(sql).fetchall()]
+
+
+def _drop_superseded(conn, name, keep, path):
+    """
+    Drop every version of `name` not in `keep`
+    """
+    version = re.compile(re.escape(name) + r"_[0-9a-f]{16}")
+    for table in _table_names(conn):
+        if version.fullmatch(table) and table not in keep:
+            conn.execute(f"DROP TABLE {_quote(table)}")
+            _columns.pop((path, table), None)
+    if not HAS_DUCKDB:
+        conn.commit()
+
+
+def ingest_snapshot(name, digest, snapshot, path=SQL_DB_PATH):
+    """
+    Copy a Parquet snapshot into the embedded database once per content digest.
+    Returns the table name to query. Older versions of the same name are dropped,
+    except the one just replaced: sessions may still be served it while the new
+    version loads, so it goes at the next ingest.
+    """
+    table = f"{name}_{digest[:16]}"
+    with _lock:
+        conn = _connection(path)
+        if table not in _table_names(conn):
+            if HAS_DUCKDB:
+                conn.execute(f"CREATE TABLE {_quote(table)} AS SELECT * FROM read_parquet(?)", [snapshot])
+            else:
+                pd.read_parquet(snapshot).to_sql(table, conn, index=False)
+                conn.commit()
+        previous, latest = _versions.get((path, name), (None, None))
+        if table != latest:
+            previous, latest = latest, table
+            _versions[(path, name)] = (previous, latest)
+        _drop_superseded(conn, name, (previous, latest), path)
+    return table
+
+
+def table_columns(table, path=SQL_DB_PATH):
+    """
+    Column names of a table, looked up once
+    """
+    key = (path, table)
+    if key not in _columns:
+        with _lock:
+            cursor = _connection(path).execute(f"SELECT * FROM {_quote(table)} LIMIT 0")
+            _columns[key] = [column[0] for column in cursor.description]
+    return _columns[key]
+
+
+def _where(filters):
+    """
+    WHERE clause and parameters for column filters: one value (=) or several (IN).
+    None, "All..." values or an empty list leave a column unfiltered.
+    """
+    clauses, params = [], []
+    for column, values in compile_filter_plan(filters):
+        if len(values) == 1:
+            clauses.append(f"{_quote(column)} = ?")
+        else:
+            clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def distinct_rows(table, columns, path=SQL_DB_PATH):
+    """
+    Distinct combinations of the given columns as a frame
+    """
+    select = ", ".join(_quote(col) for col in columns)
+    rows = _query(f"SELECT DISTINCT {select} FROM {_quote(table)}", (), path)
+    return pd.DataFrame(rows, columns=list(columns))
+
+
+def summarize(table, filters=None, path=SQL_DB_PATH):
+    """
+    Scope summary computed inside the database, in the same shape as
+    scorecard_metrics.summarize_frame: only the column moments reach Python
+    """
+    available = set(table_columns(table, path))
+    columns = [col for col in metric_columns() if col in available]
+    where, params = _where(filters or {})
+
+    # Two passes over the scope: the means first, then squared deviations from them,
+    # so the variance doesn't suffer the cancellation of a sum-of-squares formula
+    quoted = [_quote(col) for col in columns]
+    means = ", ".join(f"AVG({q}) AS m{i}" for i, q in enumerate(quoted))
+    aggregates = "".join(
+        f", COUNT({q}), SUM({q}), SUM(({q} - m{i}) * ({q} - m{i})), MIN({q}), MAX({q})" for i, q in enumerate(quoted)
+    )
+    sql = f"WITH scope AS (SELECT * FROM {_quote(table)}{where})"
+    if columns:
+        sql += f", means AS (SELECT {means} FROM scope) SELECT COUNT(*){aggregates} FROM scope CROSS JOIN means"
+    else:
+        sql += " SELECT COUNT(*) FROM scope"
+    row = _query(sql, params, path)[0]
+    moments = {'rows': row[0]}
+    for i, col in enumerate(columns):
+        count, total, m2, low, high = row[1 + 5 * i:6 + 5 * i]
+        # Match pandas: sums of no rows are 0, extremes of no rows are NaN
+        moments.update({
+            f'count:{col}': count, f'sum:{col}': total or 0.0, f'm2:{col}': m2 or 0.0,
+            f'min:{col}': float('nan') if low is None else low,
+            f'max:{col}': float('nan') if high is None else high
+        })
+
+    pl_counts = {}
+    if 'Performance_Level' in available:
+        sql = f"SELECT \"Performance_Level\", COUNT(*) FROM {_quote(table)}{where} GROUP BY \"Performance_Level\""
+        pl_counts = dict(_query(sql, params, path))
+
+    first_rank = 'N/A'
+    if 'overall_rank' in available:
+        rows = _query(f"SELECT \"overall_rank\" FROM {_quote(table)}{where} ORDER BY rowid LIMIT 1", params, path)
+        if rows:
+            first_rank = rows[0][0]
+
+    return summary_from_moments(moments, columns, pl_counts, first_rank)
+
+
+def scope_rank(table, scope_filters, filters, score_column, group_column='PG', path=SQL_DB_PATH):
+    """
+    Rank of the single row matching `filters` within its peer group among the rows
+    matching `scope_filters`, computed with window functions inside the database, in
+    the same shape as ranking.row_rank. None unless exactly one row matches.
+    """
+    available = set(table_columns(table, path))
+    if score_column not in available:
+        return None
+    where, params = _where(filters)
+    rows = _query(f"SELECT rowid FROM {_quote(table)}{where} LIMIT 2", params, path)
+    if len(rows) != 1:
+        return None
+
+    score = _quote(score_column)
+    group = _quote(group_column) if group_column in available else '0'
+    scope_where, scope_params = _where(scope_filters)
+    scope_where += f" AND {score} IS NOT NULL" if scope_where else f" WHERE {score} IS NOT NULL"
+    # The default frame of an ordered window ends at the last tie, so the ascending count
+    # is the number of peers scoring at or below the row
+    sql = (f"SELECT dense, size, at_or_below, grp FROM ("
+           f"SELECT rowid AS row_id, {group} AS grp, "
+           f"DENSE_RANK() OVER (PARTITION BY {group} ORDER BY {score} DESC) AS dense, "
+           f"COUNT(*) OVER (PARTITION BY {group}) AS size, "
+           f"COUNT(*) OVER (PARTITION BY {group} ORDER BY {score}) AS at_or_below "
+           f"FROM {_quote(table)}{scope_where}) AS ranked WHERE row_id = ?")
+    ranked = _query(sql, [*scope_params, rows[0][0]], path)
+    if not ranked:
+        return None
+    dense, size, at_or_below, group_value = ranked[0]
+    return {'rank': int(dense), 'of': int(size), 'percentile': at_or_below / size * 100, 'group': group_value}
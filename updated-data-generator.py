@@ -4,6 +4,9 @@ from datetime import datetime, timedelta
 import random
 import string
 
+from partitioned_store import write_partitioned_dataset
+from schema import apply_long_schema
+
 def generate_sid():
     letter = random.choice(string.ascii_uppercase)
     numbers = ''.join(random.choices(string.digits, k=6))
@@ -140,6 +143,9 @@ def generate_chase_scorecard_data(start_date='2024-06-01', end_date='2024-09-30'
     
     # Save to Excel
     df.to_excel('scorecard_data_long.xlsx', index=False)
+
+    # Also write the Division/period partitioned dataset the dashboard reads
+    write_partitioned_dataset(apply_long_schema(df))
     print(f"\nGenerated {len(df)} records for {len(chase_branches['Ohio'] + chase_branches['Florida'])} branches")
     return df
 
@@ -24,10 +24,21 @@ def create_comparison_metric(value):
     arrow_class = "arrow-up" if is_positive else "arrow-down"
     return f'<span class="{color_class} {arrow_class}">{value}</span>'
 
+def format_comparison(value):
+    if value is None:
+        return "0.0%"
+    return f"{'+' if value > 0 else ''}{value:.1f}%"
+
+def format_spread(summary, column_name):
+    """Standard deviation and range of a column across the branches in scope"""
+    std = summary.get('stds', {}).get(column_name)
+    if std is None or std != std:
+        return ""
+    return f"σ {std:.2f} · range {summary['mins'][column_name]:.2f}–{summary['maxs'][column_name]:.2f}"
+
 def calculate_comparison(df, column_name):
     try:
-        value = df[column_name].mean()
-        return f"{'+' if value > 0 else ''}{value:.1f}%"
+        return format_comparison(df[column_name].mean())
     except:
         return "0.0%"
 